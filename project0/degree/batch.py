@@ -0,0 +1,257 @@
+"""
+Batch and server mode for degrees queries.
+
+The data is loaded once and then every query is answered from memory.
+Queries are read one per line, either as "name<TAB>name" or as a JSON
+object {"source": ..., "target": ...}. Results are written as JSON
+lines in the same order, with an error object in place of any
+malformed line. A person can also be given by IMDB id, which
+is how ambiguous names are resolved without a prompt.
+
+    python batch.py large --input queries.txt
+    python batch.py large --input - --workers 8 < queries.txt
+    python batch.py large --port 8000
+"""
+
+import argparse
+import json
+import multiprocessing
+import queue
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import degrees
+
+# Queries each worker may have in flight in batch mode; bounds memory
+# while the output waits for the oldest one
+WINDOW = 64
+
+
+def resolve(name):
+    """
+    Returns (person_id, error) for a name or IMDB id.
+    """
+    if name in degrees.people:
+        return name, None
+    person_ids = sorted(degrees.names.get(name.lower(), set()))
+    if len(person_ids) == 0:
+        return None, {"error": "Person not found.", "name": name,
+                      "suggestions": degrees.suggest_names(name)}
+    if len(person_ids) > 1:
+        return None, {
+            "error": "Ambiguous name.",
+            "name": name,
+            "candidates": [
+                {"id": person_id,
+                 "birth": degrees.people[person_id]["birth"]}
+                for person_id in person_ids
+            ]
+        }
+    return person_ids[0], None
+
+
+def answer(query):
+    """
+    Answers one (source, target) query and returns a JSON-able dict.
+    """
+    source_name, target_name = query
+    result = {"source": source_name, "target": target_name}
+    source, error = resolve(source_name)
+    if error is None:
+        target, error = resolve(target_name)
+    if error is not None:
+        result.update(error)
+        return result
+
+    path = degrees.shortest_path(source, target)
+    if path is None:
+        result["degrees"] = None
+        return result
+    result["degrees"] = len(path)
+    result["path"] = [
+        {
+            "movie_id": movie_id,
+            "movie": degrees.movies[movie_id]["title"],
+            "person_id": person_id,
+            "person": degrees.people[person_id]["name"]
+        }
+        for movie_id, person_id in path
+    ]
+    return result
+
+
+def parse_query(line):
+    """
+    Parses one input line into a (source, target) pair,
+    or returns None for blank lines.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        query = json.loads(line)
+        source, target = query["source"], query["target"]
+        if not isinstance(source, str) or not isinstance(target, str):
+            raise ValueError("source and target must be strings")
+        return source, target
+    source, target = line.split("\t")
+    return source.strip(), target.strip()
+
+
+def read_queries(lines):
+    """
+    Yields a (source, target) pair for every query line, or an error
+    dict in place of a malformed one, so one bad line does not end
+    the whole run.
+    """
+    for line in lines:
+        try:
+            query = parse_query(line)
+        except (ValueError, KeyError):
+            yield {"error": "Malformed query line.",
+                   "line": line.rstrip("\r\n")}
+            continue
+        if query is not None:
+            yield query
+
+
+def init_worker(directory):
+    """
+    Makes sure a worker process has the data. With the fork start
+    method the loaded data is inherited (and shared copy-on-write),
+    so this only loads anything on platforms without fork.
+    """
+    if degrees.graph is None:
+        degrees.load_data(directory)
+
+
+def run_batch(lines, out, directory, workers=1):
+    """
+    Answers every query in `lines` and writes one JSON line per query,
+    each as soon as it and every query before it are answered, so
+    piped input is answered as it comes in.
+    """
+    if workers <= 1:
+        for query in read_queries(lines):
+            result = query if isinstance(query, dict) else answer(query)
+            write_result(out, result)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "fork" if "fork" in methods else None
+    )
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_worker,
+                             initargs=(directory,)) as executor:
+        # A reader thread submits queries while this one writes the
+        # results in order; the bounded queue keeps at most a window
+        # of them in flight, and None marks the end of the input
+        pending = queue.Queue(maxsize=workers * WINDOW)
+        failure = []
+
+        def submit():
+            try:
+                for query in read_queries(lines):
+                    if isinstance(query, dict):
+                        future = Future()
+                        future.set_result(query)
+                    else:
+                        future = executor.submit(answer, query)
+                    pending.put(future)
+            except Exception as e:
+                failure.append(e)
+            finally:
+                pending.put(None)
+
+        reader = threading.Thread(target=submit, daemon=True)
+        reader.start()
+        while True:
+            future = pending.get()
+            if future is None:
+                break
+            write_result(out, future.result())
+        if failure:
+            raise failure[0]
+
+
+def write_result(out, result):
+    out.write(json.dumps(result) + "\n")
+    out.flush()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    GET /?source=...&target=...  answers a single query.
+    POST /  with query lines in the body answers all of them, with an
+            error object in place of any malformed line.
+    """
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        try:
+            query = (params["source"][0], params["target"][0])
+        except KeyError:
+            self.send_error(400, "source and target are required")
+            return
+        self.reply(json.dumps(answer(query)) + "\n")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            lines = self.rfile.read(length).decode("utf-8").splitlines()
+        except UnicodeDecodeError:
+            self.send_error(400, "body is not UTF-8")
+            return
+        # Malformed lines are reported in place, as in batch mode
+        self.reply("".join(
+            json.dumps(query if isinstance(query, dict) else answer(query))
+            + "\n" for query in read_queries(lines)
+        ))
+
+    def reply(self, body):
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer degrees queries.")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--input", help="query file, or - for stdin")
+    parser.add_argument("--port", type=int, help="serve queries over HTTP")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    if (args.input is None) == (args.port is None):
+        parser.error("exactly one of --input and --port is required")
+    if args.port is not None and args.workers != 1:
+        parser.error("--workers only applies to --input")
+
+    print("Loading data...", file=sys.stderr)
+    degrees.load_data(args.directory)
+    print("Data loaded.", file=sys.stderr)
+
+    if args.port is not None:
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), QueryHandler)
+        print(f"Serving on http://127.0.0.1:{args.port}/", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.input == "-":
+        run_batch(sys.stdin, sys.stdout, args.directory, args.workers)
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            run_batch(f, sys.stdout, args.directory, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Benchmarks for degrees search.
+
+Generate a synthetic corpus in the same CSV format as the IMDB data,
+with power-law cast sizes and power-law actor popularity:
+
+    python bench.py generate synthetic --people 100000 --movies 50000
+
+Then time load_data and a fixed, seeded set of random queries for
+every search method:
+
+    python bench.py run synthetic --queries 200 --landmarks 16
+
+For each method the report shows the mean number of people expanded,
+p50/p99 query latency, and the peak memory the queries allocated,
+measured by tracemalloc in a second, untimed pass over the same pairs.
+load_data is reported with the peak RSS of the process.
+"""
+
+import argparse
+import csv
+import os
+import random
+import time
+import tracemalloc
+from itertools import accumulate
+
+import degrees
+import paths
+from landmarks import LandmarkIndex, astar_search, choose_landmarks
+
+FIRST_NAMES = ["Ada", "Ben", "Cleo", "Dev", "Eli", "Fay", "Gus", "Hana",
+               "Ivo", "Jun", "Kai", "Lea", "Max", "Nia", "Oto", "Pia",
+               "Quin", "Rui", "Sol", "Tess", "Uma", "Vic", "Wen", "Yara"]
+LAST_SYLLABLES = ["ka", "ro", "mi", "lan", "ter", "so", "vi", "den",
+                  "ba", "lu", "ne", "shi", "gor", "pa", "tel", "wi"]
+
+
+def generate(directory, people=100000, movies=50000, alpha=2.1,
+             min_cast=4, max_cast=60, seed=0):
+    """
+    Writes people.csv, movies.csv and stars.csv into directory.
+
+    Cast sizes follow a Pareto distribution with exponent alpha between
+    min_cast and max_cast, and each cast member is drawn with Zipf-like
+    weights, so a few people star in many movies and most in only one
+    or two.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, "people.csv"), "w",
+              encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for i in range(people):
+            last = "".join(rng.choice(LAST_SYLLABLES)
+                           for _ in range(rng.randint(2, 3)))
+            name = f"{rng.choice(FIRST_NAMES)} {last.capitalize()}"
+            birth = str(rng.randint(1900, 2005)) if rng.random() < 0.8 else ""
+            writer.writerow([str(i + 1), name, birth])
+
+    with open(os.path.join(directory, "movies.csv"), "w",
+              encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for i in range(movies):
+            writer.writerow([str(i + 1), f"Movie {i + 1}",
+                             str(rng.randint(1920, 2020))])
+
+    # Popularity weight of person i is 1 / (i + 1), shuffled so ids
+    # say nothing about popularity
+    order = list(range(people))
+    rng.shuffle(order)
+    weights = list(accumulate(1 / (rank + 1) for rank in range(people)))
+    with open(os.path.join(directory, "stars.csv"), "w",
+              encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie in range(movies):
+            size = min(max_cast,
+                       int(min_cast * rng.paretovariate(alpha - 1)))
+            cast = set(rng.choices(order, cum_weights=weights, k=size))
+            for person in cast:
+                writer.writerow([str(person + 1), str(movie + 1)])
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def traced_peak(function):
+    """
+    Calls function with tracemalloc on and returns the peak memory, in
+    MB, allocated during the call on top of what was already live.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1 << 20)
+
+
+def run(directory, queries=200, seed=0, methods=None, landmarks=0):
+    """
+    Loads directory, times `queries` random pairs with each method,
+    and returns a list of result rows (dicts).
+    """
+    start = time.perf_counter()
+    degrees.load_data(directory, cache=False, landmarks=False, fuzzy=False)
+    load_seconds = time.perf_counter() - start
+    graph = degrees.graph
+    rows = [{"method": "load_data", "seconds": load_seconds,
+             "rss": degrees.peak_rss()}]
+
+    searches = {
+        "bfs": lambda s, t: paths.restricted_search(graph, s, t,
+                                                    set(), set()),
+        "bidirectional": graph.bidirectional_search,
+    }
+    if landmarks:
+        def build():
+            return LandmarkIndex.build(graph, choose_landmarks(graph,
+                                                               landmarks))
+        start = time.perf_counter()
+        index = build()
+        rows.append({"method": "landmarks",
+                     "seconds": time.perf_counter() - start,
+                     "memory": traced_peak(build)})
+        searches["alt"] = lambda s, t: astar_search(graph, index, s, t)
+
+    rng = random.Random(seed)
+    count = len(graph.person_ids)
+    pairs = [(rng.randrange(count), rng.randrange(count))
+             for _ in range(queries)]
+
+    for method in methods or searches:
+        search = searches[method]
+        latencies = []
+        expanded = 0
+        lengths = []
+        for source, target in pairs:
+            start = time.perf_counter()
+            path = search(source, target)
+            latencies.append(time.perf_counter() - start)
+            expanded += graph.expanded
+            lengths.append(None if path is None else len(path))
+
+        def replay():
+            for source, target in pairs:
+                search(source, target)
+        rows.append({
+            "method": method,
+            "expanded": expanded / len(pairs),
+            "p50": percentile(latencies, 0.50),
+            "p99": percentile(latencies, 0.99),
+            "connected": sum(length is not None for length in lengths),
+            "lengths": lengths,
+            "memory": traced_peak(replay),
+        })
+    return rows
+
+
+def report(rows):
+    for row in rows:
+        if "rss" in row:
+            rss = "n/a" if row["rss"] is None else f"{row['rss']:.1f} MB"
+            memory = f"peak RSS {rss}"
+        else:
+            memory = f"peak alloc {row['memory']:.1f} MB"
+        if "seconds" in row:
+            print(f"{row['method']:>14}: {row['seconds']:.2f}s, {memory}")
+        else:
+            print(f"{row['method']:>14}: "
+                  f"expanded {row['expanded']:.0f}, "
+                  f"p50 {row['p50'] * 1000:.2f} ms, "
+                  f"p99 {row['p99'] * 1000:.2f} ms, "
+                  f"{row['connected']} connected, {memory}")
+
+    # Every method must agree on the length of every path
+    answers = [row["lengths"] for row in rows if "lengths" in row]
+    if any(lengths != answers[0] for lengths in answers):
+        print("WARNING: search methods disagree on path lengths")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark degrees search.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="write a synthetic corpus")
+    gen.add_argument("directory")
+    gen.add_argument("--people", type=int, default=100000)
+    gen.add_argument("--movies", type=int, default=50000)
+    gen.add_argument("--alpha", type=float, default=2.1,
+                     help="power-law exponent of cast sizes")
+    gen.add_argument("--min-cast", type=int, default=4)
+    gen.add_argument("--max-cast", type=int, default=60)
+    gen.add_argument("--seed", type=int, default=0)
+
+    bench = commands.add_parser("run", help="time load_data and queries")
+    bench.add_argument("directory")
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--landmarks", type=int, default=0,
+                       help="build this many landmarks and time ALT too")
+    bench.add_argument("--methods", nargs="*",
+                       help="subset of bfs, bidirectional, alt")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate(args.directory, args.people, args.movies, args.alpha,
+                 args.min_cast, args.max_cast, args.seed)
+    else:
+        report(run(args.directory, args.queries, args.seed, args.methods,
+                   args.landmarks))
+
+
+if __name__ == "__main__":
+    main()
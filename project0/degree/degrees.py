@@ -1,73 +1,469 @@
 import csv
+import gc
+import json
+import os
+import random
 import sys
+import time
+import warnings
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+from sys import intern
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import paths
+import snapshot
+from filters import EdgeFilter
+from graph import Graph
+from landmarks import FILENAME as LANDMARKS_FILENAME
+from landmarks import LandmarkIndex, astar_search
+from nameindex import NameIndex
+from records import Movie, Person
 from util import Node, StackFrontier, QueueFrontier
 
 # Maps names to a set of corresponding person_ids
 names = {}
 
-# Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids)
+# Maps person_ids to a Person record of: name, birth, movies (a set of
+# movie_ids); fields can be read as person.name or person["name"]
 people = {}
 
-# Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
+# Maps movie_ids to a Movie record of: title, year, stars (a set of
+# person_ids); fields can be read as movie.title or movie["title"]
 movies = {}
 
+# Rows parsed per chunk by read_csv
+CHUNK_SIZE = 10000
+
+# Compact CSR form of the co-star graph, built at the end of load_data
+graph = None
+
+# Landmark distances used for ALT search, see landmarks.py
+landmark_index = None
+
+# Prefix and trigram index over the keys of names, see nameindex.py;
+# built by suggest_names on first use when use_fuzzy is set
+name_index = None
+use_fuzzy = False
+
+# Where the data was loaded from, and whether a snapshot is kept there
+data_directory = None
+use_cache = False
 
-def load_data(directory):
+# Append-only log of the deltas applied to a data directory, one JSON
+# record per line, kept next to the CSV files so the deltas are
+# replayed when the snapshot has to be rebuilt from them
+DELTA_LOG = "deltas.log"
+
+
+def load_data(directory, cache=True, landmarks=True, fuzzy=True):
     """
     Load data from CSV files into memory.
+
+    If cache is set, a snapshot of the loaded data is kept next to
+    the CSV files and memory-mapped on later runs, as long as none
+    of the CSV files changed since it was written. A CSV counts as
+    changed when its size or mtime differ, or its sha1 does where
+    those alone could hide an edit (see snapshot.is_fresh). The
+    people and movies records are then built on first use.
+
+    When the data is read from the CSV files instead, the deltas in
+    the directory's delta log (see ingest_delta) are applied again.
+
+    If landmarks is set, the landmark index built by landmarks.py is
+    loaded too when there is a fresh one for this directory.
+
+    If fuzzy is set, suggest_names works; the name index behind it
+    is only built the first time it is needed.
+    """
+    global names, people, movies, graph, landmark_index, name_index
+    global data_directory, use_cache, use_fuzzy
+
+    # Compiled filters refer to the graph being replaced
+    compile_filter.cache_clear()
+    data_directory = directory
+    # Replayed deltas are saved with the rebuilt snapshot, not one by one
+    use_cache = False
+    name_index = None
+    use_fuzzy = fuzzy
+    landmark_index = None
+
+    # The millions of objects created here cannot form cycles, but the
+    # cyclic garbage collector would rescan all of them again and again
+    with paused_gc():
+        loaded = snapshot.load(directory) if cache else None
+        if loaded is not None:
+            names, people, movies, graph = loaded
+        else:
+            names, people, movies = {}, {}, {}
+            read_csv(directory)
+
+            # Number people and movies densely and build the CSR arrays
+            graph = Graph.from_data(people, movies)
+            replay_deltas(directory)
+
+            if cache:
+                try:
+                    snapshot.save(directory, names, people, movies, graph)
+                except OSError:
+                    # read-only data directory, just run without a snapshot
+                    pass
+        use_cache = cache
+
+        if landmarks:
+            landmark_index = LandmarkIndex.load(
+                os.path.join(directory, LANDMARKS_FILENAME), directory, graph
+            )
+
+
+def read_csv(directory):
+    """
+    Parses the CSV files into names, people and movies.
+
+    Rows are read in chunks with a plain csv.reader, ids and other
+    often repeated strings are interned so every set refers to a
+    single copy, and each row becomes a slotted record.
     """
     # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
+    for chunk in read_chunks(f"{directory}/people.csv", "id", "name", "birth"):
+        for person_id, name, birth in chunk:
+            person_id = intern(person_id)
+            people[person_id] = Person(name, intern(birth))
+            key = name.lower()
+            if key not in names:
+                names[key] = {person_id}
             else:
-                names[row["name"].lower()].add(row["id"])
+                names[key].add(person_id)
 
     # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
+    for chunk in read_chunks(f"{directory}/movies.csv", "id", "title", "year"):
+        for movie_id, title, year in chunk:
+            movies[intern(movie_id)] = Movie(title, intern(year))
 
     # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    for chunk in read_chunks(f"{directory}/stars.csv",
+                             "person_id", "movie_id"):
+        for person_id, movie_id in chunk:
             try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
+                person = people[person_id]
+                movie = movies[movie_id]
             except KeyError:
-                pass
+                continue
+            # use the interned keys, not this row's copies
+            person.movies.add(intern(movie_id))
+            movie.stars.add(intern(person_id))
+
+
+def read_chunks(path, *columns):
+    """
+    Yields chunks of up to CHUNK_SIZE rows of a CSV file, each row
+    reduced to a tuple of the given columns in that order.
+    """
+    with open(path, encoding="utf-8", newline="", buffering=1 << 20) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        pick = itemgetter(*[header.index(column) for column in columns])
+        while True:
+            rows = list(islice(reader, CHUNK_SIZE))
+            if not rows:
+                return
+            yield map(pick, rows)
+
+
+@contextmanager
+def paused_gc():
+    """
+    Disables the cyclic garbage collector for the duration
+    of a with block.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in MB,
+    or None where the resource module is not available.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage / (1 << 20) if sys.platform == "darwin" else usage / 1024
+
+
+def add_person(person_id, name, birth=""):
+    """
+    Adds a person, or returns False if the id is already known.
+    """
+    global landmark_index
+
+    if person_id in people:
+        return False
+    person_id = intern(person_id)
+    people[person_id] = Person(name, intern(birth))
+    key = name.lower()
+    if key not in names:
+        names[key] = {person_id}
+        if name_index is not None:
+            name_index.add(key)
+    else:
+        names[key].add(person_id)
+    graph.add_person(person_id)
+    # masks compiled so far do not cover the new person, and the
+    # landmark distance arrays have no entry for them
+    compile_filter.cache_clear()
+    landmark_index = None
+    return True
+
+
+def add_movie(movie_id, title, year=""):
+    """
+    Adds a movie, or returns False if the id is already known.
+    """
+    if movie_id in movies:
+        return False
+    movie_id = intern(movie_id)
+    movies[movie_id] = Movie(title, intern(year))
+    graph.add_movie(movie_id)
+    # masks compiled so far do not cover the new movie
+    compile_filter.cache_clear()
+    return True
+
+
+def add_star(person_id, movie_id):
+    """
+    Records that a known person starred in a known movie. Returns
+    False if that was already known; raises KeyError for unknown ids.
+    """
+    global landmark_index
+
+    person = people[person_id]
+    movie = movies[movie_id]
+    if movie_id in person.movies:
+        return False
+    person_id = intern(person_id)
+    movie_id = intern(movie_id)
+    person.movies.add(movie_id)
+    movie.stars.add(person_id)
+    graph.add_star(graph.person_index[person_id],
+                   graph.movie_index[movie_id])
+    # A new edge can only shorten paths, so landmark distances may now
+    # overestimate them; rebuild the index with landmarks.py
+    landmark_index = None
+    return True
+
+
+def ingest_delta(delta, log=True):
+    """
+    Applies a delta directory holding any of people.csv, movies.csv and
+    stars.csv (same format as the data) to the loaded data, then checks
+    the touched people and movies and updates the snapshot if one is
+    kept. A delta whose files were already applied is skipped.
+
+    Unless log is False, the delta is also recorded in the delta log
+    of the data directory, so it survives a rebuild from the CSVs.
+
+    Returns a dict of counts plus a list of problems: star rows naming
+    unknown people or movies, and any consistency check failures.
+    """
+    report = {"people": 0, "movies": 0, "stars": 0, "problems": []}
+    record = delta_record(delta)
+    if record in graph.deltas:
+        report["skipped"] = True
+        return report
+
+    touched_people = set()
+    touched_movies = set()
+    with paused_gc():
+        path = os.path.join(delta, "people.csv")
+        if os.path.exists(path):
+            for chunk in read_chunks(path, "id", "name", "birth"):
+                for person_id, name, birth in chunk:
+                    report["people"] += add_person(person_id, name, birth)
+                    touched_people.add(person_id)
+        path = os.path.join(delta, "movies.csv")
+        if os.path.exists(path):
+            for chunk in read_chunks(path, "id", "title", "year"):
+                for movie_id, title, year in chunk:
+                    report["movies"] += add_movie(movie_id, title, year)
+                    touched_movies.add(movie_id)
+        path = os.path.join(delta, "stars.csv")
+        if os.path.exists(path):
+            for chunk in read_chunks(path, "person_id", "movie_id"):
+                for person_id, movie_id in chunk:
+                    try:
+                        report["stars"] += add_star(person_id, movie_id)
+                    except KeyError:
+                        report["problems"].append(
+                            f"unknown person or movie in star row "
+                            f"{person_id},{movie_id}"
+                        )
+                        continue
+                    touched_people.add(person_id)
+                    touched_movies.add(movie_id)
+
+    report["problems"].extend(
+        check_consistency(touched_people, touched_movies)
+    )
+    graph.deltas.append(record)
+    if log:
+        try:
+            with open(os.path.join(data_directory, DELTA_LOG), "a",
+                      encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            report["problems"].append("could not append to the delta log")
+    if use_cache:
+        try:
+            snapshot.save(data_directory, names, people, movies, graph)
+        except OSError:
+            pass
+    return report
+
+
+def delta_record(delta):
+    """
+    Returns the record of a delta directory kept in graph.deltas and
+    the delta log: its path and the fingerprints of its files.
+    """
+    record = {
+        "path": os.path.abspath(delta),
+        "sources": {}
+    }
+    for name in snapshot.SOURCES:
+        path = os.path.join(delta, name)
+        if os.path.exists(path):
+            record["sources"][name] = snapshot.fingerprint(path)
+    return record
+
+
+def replay_deltas(directory):
+    """
+    Applies the deltas in the delta log of directory again, in order.
+    A delta whose files are gone or no longer match the log is left
+    out with a warning, as are any problems it reports.
+    """
+    try:
+        with open(os.path.join(directory, DELTA_LOG),
+                  encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return
+
+    for logged in records:
+        delta = logged["path"]
+        current = delta_record(delta)
+        # Compare sizes and contents; mtimes change when files are copied
+        if ({name: [size, digest] for name, (size, _, digest)
+             in current["sources"].items()}
+                != {name: [size, digest] for name, (size, _, digest)
+                    in logged["sources"].items()}):
+            warnings.warn(f"delta {delta} is missing or changed since it "
+                          f"was applied; not replayed")
+            continue
+        report = ingest_delta(delta, log=False)
+        for problem in report["problems"]:
+            warnings.warn(f"replaying delta {delta}: {problem}")
+
+
+def check_consistency(person_ids=None, movie_ids=None):
+    """
+    Cross-checks names, people, movies and the compact graph for the
+    given people and movies (all of them by default). Returns a list
+    of problems, empty if everything agrees.
+    """
+    if person_ids is None:
+        person_ids = people
+    if movie_ids is None:
+        movie_ids = movies
+    problems = []
+    if (len(graph.person_ids) != len(people)
+            or len(graph.movie_ids) != len(movies)):
+        problems.append("graph and dicts hold different numbers of "
+                        "people or movies")
+
+    for person_id in person_ids:
+        person = people[person_id]
+        if person_id not in names.get(person.name.lower(), ()):
+            problems.append(f"{person_id} missing from names")
+        p = graph.person_index.get(person_id)
+        if p is None:
+            problems.append(f"{person_id} missing from graph")
+            continue
+        linked = {graph.movie_ids[m] for m in graph.movies_of(p)}
+        if linked != person.movies:
+            problems.append(f"movies of {person_id} differ in graph")
+        for movie_id in person.movies:
+            if person_id not in movies[movie_id].stars:
+                problems.append(f"{movie_id} does not list {person_id}")
+
+    for movie_id in movie_ids:
+        movie = movies[movie_id]
+        m = graph.movie_index.get(movie_id)
+        if m is None:
+            problems.append(f"{movie_id} missing from graph")
+            continue
+        stars = list(graph.stars_of(m))
+        linked = {graph.person_ids[p] for p in stars}
+        if linked != movie.stars:
+            problems.append(f"stars of {movie_id} differ in graph")
+        roots = {graph.find(p) for p in stars}
+        if len(roots) > 1:
+            problems.append(f"cast of {movie_id} split across components")
+        for person_id in movie.stars:
+            if movie_id not in people[person_id].movies:
+                problems.append(f"{person_id} does not list {movie_id}")
+    return problems
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    args = sys.argv[1:]
+    check = "--check" in args
+    if check:
+        args.remove("--check")
+    if len(args) > 1:
+        sys.exit("Usage: python degrees.py [directory] [--check]")
+    directory = args[0] if len(args) == 1 else "large"
 
     # Load data from files into memory
     print("Loading data...")
+    start = time.perf_counter()
     load_data(directory)
-    print("Data loaded.")
+    elapsed = time.perf_counter() - start
+    rss = peak_rss()
+    if rss is None:
+        print(f"Data loaded in {elapsed:.2f}s.")
+    else:
+        print(f"Data loaded in {elapsed:.2f}s, peak RSS {rss:.1f} MB.")
 
-    source = person_id_for_name(input("Name: "))
+    if check:
+        mismatches = check_search()
+        if landmark_index is not None:
+            mismatches += check_search(method="alt")
+        for source, target in mismatches:
+            print(f"Mismatch: {source} -> {target}")
+        sys.exit(1 if mismatches else 0)
+
+    name = input("Name: ")
+    source = person_id_for_name(name)
     if source is None:
-        sys.exit("Person not found.")
-    target = person_id_for_name(input("Name: "))
+        not_found(name)
+    name = input("Name: ")
+    target = person_id_for_name(name)
     if target is None:
-        sys.exit("Person not found.")
+        not_found(name)
 
     path = shortest_path(source, target)
 
@@ -84,12 +480,42 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, method="bidirectional"):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
     If no possible path, returns None.
+
+    method is one of "bfs", "bidirectional" or "alt"; "alt" needs a
+    landmark index and falls back to "bidirectional" without one.
+    """
+    if method == "bfs":
+        return breadth_first_search(source, target)
+    if method == "alt" and landmark_index is not None:
+        return alt_search(source, target)
+    return bidirectional_search(source, target)
+
+
+def degrees_of_separation(source, target):
+    """
+    Returns the number of degrees between source and target, or None
+    if they are not connected. Answered straight from the landmark
+    index when one of them is a landmark.
+    """
+    if landmark_index is not None:
+        distance = landmark_index.distance(graph.person_index[source],
+                                           graph.person_index[target])
+        if distance is not None:
+            return None if distance < 0 else distance
+    path = shortest_path(source, target)
+    return None if path is None else len(path)
+
+
+def breadth_first_search(source, target):
+    """
+    Single-ended BFS from the source, used as the reference
+    implementation for the bidirectional search.
     """
 
     myqueue = QueueFrontier()
@@ -123,6 +549,149 @@ def shortest_path(source, target):
     return answer
 
 
+def bidirectional_search(source, target):
+    """
+    Searches from both ends at once over the compact graph built by
+    load_data. Returns the same path format as breadth_first_search.
+    """
+    return from_graph_path(graph.bidirectional_search(
+        graph.person_index[source], graph.person_index[target]
+    ))
+
+
+def alt_search(source, target):
+    """
+    A* search over the compact graph using landmark lower bounds.
+    Returns the same path format as breadth_first_search.
+    """
+    return from_graph_path(astar_search(
+        graph, landmark_index,
+        graph.person_index[source], graph.person_index[target]
+    ))
+
+
+def from_graph_path(path):
+    """
+    Converts a path of (movie, person) ints back to IMDB ids.
+    """
+    if path is None:
+        return None
+    return [(graph.movie_ids[m], graph.person_ids[p]) for m, p in path]
+
+
+def count_shortest_paths(source, target):
+    """
+    Returns how many distinct shortest paths connect source and
+    target (0 if they are not connected).
+    """
+    return paths.count_shortest_paths(
+        graph, graph.person_index[source], graph.person_index[target]
+    )
+
+
+def all_shortest_paths(source, target):
+    """
+    Lazily yields every shortest path from source to target,
+    in the same format as shortest_path.
+    """
+    for path in paths.all_shortest_paths(
+        graph, graph.person_index[source], graph.person_index[target]
+    ):
+        yield from_graph_path(path)
+
+
+def k_shortest_paths(source, target, k=None):
+    """
+    Lazily yields up to k simple paths from source to target, shortest
+    first, in the same format as shortest_path. With k=None it keeps
+    going until the caller stops iterating.
+    """
+    found = paths.k_shortest_paths(
+        graph, graph.person_index[source], graph.person_index[target]
+    )
+    for path in islice(found, k):
+        yield from_graph_path(path)
+
+
+def shortest_path_between(sources, targets, min_year=None, max_year=None,
+                          exclude_movies=(), exclude_people=()):
+    """
+    Returns (source, path) for the shortest path from any person in
+    sources to any person in targets, where path is a list of
+    (movie_id, person_id) pairs as in shortest_path, or None.
+
+    Only movies released between min_year and max_year (inclusive)
+    are used when either is given, and the movies and people in
+    exclude_movies and exclude_people are never used.
+    """
+    edge_filter = compile_filter(min_year, max_year,
+                                 frozenset(exclude_movies),
+                                 frozenset(exclude_people))
+    found = graph.search(
+        [graph.person_index[source] for source in sources],
+        [graph.person_index[target] for target in targets],
+        edge_filter.movie_mask, edge_filter.person_mask
+    )
+    if found is None:
+        return None
+    source, path = found
+    return graph.person_ids[source], from_graph_path(path)
+
+
+@lru_cache(maxsize=32)
+def compile_filter(min_year, max_year, exclude_movies, exclude_people):
+    """
+    Compiles (and remembers) the masks for a set of constraints, so
+    repeated constrained queries only pay for them once.
+    """
+    return EdgeFilter.compile(graph, movies, min_year, max_year,
+                              exclude_movies, exclude_people)
+
+
+def component_stats():
+    """
+    Returns statistics about the connected components of the
+    co-star graph: number of people and components, size of the
+    largest one, and how many people are isolated.
+    """
+    return graph.component_stats()
+
+
+def check_search(samples=100, seed=0, method="bidirectional"):
+    """
+    Compares the given search method against breadth_first_search on
+    random pairs of people. Returns the list of mismatching pairs.
+    """
+    rng = random.Random(seed)
+    person_ids = sorted(people)
+    mismatches = []
+    for _ in range(samples):
+        source = rng.choice(person_ids)
+        target = rng.choice(person_ids)
+        if source == target:
+            continue
+        expected = breadth_first_search(source, target)
+        actual = shortest_path(source, target, method)
+        if expected is None or actual is None:
+            if expected is not actual:
+                mismatches.append((source, target))
+        elif (len(expected) != len(actual)
+              or not is_valid_path(source, target, actual)):
+            mismatches.append((source, target))
+    return mismatches
+
+
+def is_valid_path(source, target, path):
+    """
+    Checks that every step of the path is a real co-starring edge
+    and that the path ends at the target.
+    """
+    now = source
+    for movie_id, person_id in path:
+        if (movie_id, person_id) not in neighbors_for_person(now):
+            return False
+        now = person_id
+    return now == target
 
 
 def person_id_for_name(name):
@@ -151,6 +720,32 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def suggest_names(name, limit=5):
+    """
+    Returns up to `limit` known names close to the given one,
+    best first, for when an exact lookup fails.
+    """
+    global name_index
+
+    if not use_fuzzy:
+        return []
+    if name_index is None:
+        with paused_gc():
+            name_index = NameIndex(names)
+    return [people[next(iter(names[key]))]["name"]
+            for key in name_index.search(name, limit)]
+
+
+def not_found(name):
+    """
+    Exits with "Person not found.", listing close names if any.
+    """
+    suggestions = suggest_names(name)
+    if suggestions:
+        print("Did you mean: " + ", ".join(suggestions) + "?")
+    sys.exit("Person not found.")
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
@@ -0,0 +1,52 @@
+"""
+Edge filters for constrained degrees queries.
+
+A filter is compiled once into two bytearrays over the compact graph,
+one entry per movie and one per person, so the search only does an
+index lookup per edge instead of calling back into Python.
+"""
+
+from records import field
+
+
+class EdgeFilter():
+
+    def __init__(self, movie_mask, person_mask):
+        # 1 for every movie / person a path may use, 0 otherwise;
+        # None when nothing is excluded
+        self.movie_mask = movie_mask
+        self.person_mask = person_mask
+
+    @classmethod
+    def compile(cls, graph, movies, min_year=None, max_year=None,
+                exclude_movies=(), exclude_people=()):
+        """
+        Builds the masks for the given constraints. `movies` is the
+        degrees.movies dict or LazyRecords, used for the years, which
+        are read without building lazy records; movies without a
+        usable year are dropped whenever a year range is given.
+        Excluded movies and people are given by IMDB id.
+        """
+        movie_mask = None
+        if min_year is not None or max_year is not None or exclude_movies:
+            movie_mask = bytearray(b"\1") * len(graph.movie_ids)
+        if min_year is not None or max_year is not None:
+            low = float("-inf") if min_year is None else min_year
+            high = float("inf") if max_year is None else max_year
+            for m, movie_id in enumerate(graph.movie_ids):
+                try:
+                    year = int(field(movies, movie_id, "year"))
+                except ValueError:
+                    movie_mask[m] = 0
+                    continue
+                if not low <= year <= high:
+                    movie_mask[m] = 0
+        for movie_id in exclude_movies:
+            movie_mask[graph.movie_index[movie_id]] = 0
+
+        person_mask = None
+        if exclude_people:
+            person_mask = bytearray(b"\1") * len(graph.person_ids)
+            for person_id in exclude_people:
+                person_mask[graph.person_index[person_id]] = 0
+        return cls(movie_mask, person_mask)
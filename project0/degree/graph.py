@@ -0,0 +1,417 @@
+from array import array
+
+
+class Graph():
+    """
+    Compact co-star graph.
+
+    People and movies are numbered densely (0, 1, 2, ...) and the
+    person-movie bipartite graph is stored as two CSR structures:
+    the movies of person p are
+        person_movies[person_offsets[p]:person_offsets[p + 1]]
+    and the stars of movie m are
+        movie_stars[movie_offsets[m]:movie_offsets[m + 1]]
+
+    Edges added after the arrays were built (see add_star) live in the
+    extra_movies / extra_stars dicts until the next compact(); every
+    loop over the arrays also looks there.
+    """
+
+    def __init__(self, person_ids, movie_ids,
+                 person_offsets, person_movies,
+                 movie_offsets, movie_stars, component=None):
+
+        # Dense int <-> IMDB id
+        self.person_ids = person_ids
+        self.movie_ids = movie_ids
+        self.person_index = dict(zip(person_ids, range(len(person_ids))))
+        self.movie_index = dict(zip(movie_ids, range(len(movie_ids))))
+
+        # CSR arrays
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+
+        # Union-find forest over people: people who are connected share
+        # a root. Built once here (or loaded from a snapshot) and fully
+        # compressed, so component[p] is normally already the root.
+        if component is None:
+            component = self.label_components()
+        self.component = component
+        self.sizes = None
+        # Set by union until compact() compresses the forest again
+        self.merged = False
+
+        # person -> list of extra movies, movie -> list of extra stars
+        self.extra_movies = {}
+        self.extra_stars = {}
+
+        # Delta files applied on top of the CSV data, in order
+        self.deltas = []
+
+        # Number of people expanded by the last search, for benchmarks
+        self.expanded = 0
+
+    @classmethod
+    def from_data(cls, people, movies):
+        """
+        Builds the graph from the `people` and `movies` dicts
+        filled by degrees.load_data.
+        """
+        person_ids = list(people)
+        movie_ids = list(movies)
+        person_index = {
+            person_id: i for i, person_id in enumerate(person_ids)
+        }
+        movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+        person_offsets, person_movies = csr(
+            person_ids, lambda p: people[p]["movies"], movie_index
+        )
+        movie_offsets, movie_stars = csr(
+            movie_ids, lambda m: movies[m]["stars"], person_index
+        )
+        return cls(person_ids, movie_ids,
+                   person_offsets, person_movies,
+                   movie_offsets, movie_stars)
+
+    def label_components(self):
+        """
+        Runs union-find over the casts of all movies and returns an
+        array mapping every person to the root of their component.
+        """
+        parent = array("i", range(len(self.person_ids)))
+
+        def find(p):
+            while parent[p] != p:
+                parent[p] = parent[parent[p]]
+                p = parent[p]
+            return p
+
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        for m in range(len(self.movie_ids)):
+            stars = movie_stars[movie_offsets[m]:movie_offsets[m + 1]]
+            if len(stars) < 2:
+                continue
+            root = find(stars[0])
+            for p in stars[1:]:
+                other = find(p)
+                if other != root:
+                    # attach the larger id under the smaller one so
+                    # roots are deterministic
+                    if other < root:
+                        root, other = other, root
+                    parent[other] = root
+        for p in range(len(parent)):
+            parent[p] = find(p)
+        return parent
+
+    def find(self, p):
+        """
+        Returns the root of person p's component.
+        """
+        component = self.component
+        while component[p] != p:
+            p = component[p]
+        return p
+
+    def connected(self, p, q):
+        """
+        Checks in (almost always) O(1) whether p and q are connected.
+        """
+        return self.find(p) == self.find(q)
+
+    def component_sizes(self):
+        """
+        Returns a dict mapping each component root to its size.
+        """
+        if self.sizes is None:
+            # Unions since the last compact() leave people pointing at
+            # an old root, so count by the real root
+            find = self.find
+            sizes = {}
+            for p in range(len(self.component)):
+                root = find(p)
+                sizes[root] = sizes.get(root, 0) + 1
+            self.sizes = sizes
+        return self.sizes
+
+    def component_stats(self):
+        """
+        Returns summary statistics about the components.
+        """
+        sizes = self.component_sizes()
+        return {
+            "people": len(self.person_ids),
+            "components": len(sizes),
+            "largest": max(sizes.values(), default=0),
+            "isolated": sum(1 for size in sizes.values() if size == 1)
+        }
+
+    def movies_of(self, p):
+        """
+        Returns the movie ints person p starred in.
+        """
+        movies = self.person_movies[
+            self.person_offsets[p]:self.person_offsets[p + 1]
+        ]
+        if p in self.extra_movies:
+            movies = [*movies, *self.extra_movies[p]]
+        return movies
+
+    def stars_of(self, m):
+        """
+        Returns the person ints who starred in movie m.
+        """
+        stars = self.movie_stars[
+            self.movie_offsets[m]:self.movie_offsets[m + 1]
+        ]
+        if m in self.extra_stars:
+            stars = [*stars, *self.extra_stars[m]]
+        return stars
+
+    def add_person(self, person_id):
+        """
+        Adds a person with no movies and returns their int.
+        """
+        if person_id in self.person_index:
+            return self.person_index[person_id]
+        p = len(self.person_ids)
+        self.person_ids.append(person_id)
+        self.person_index[person_id] = p
+        self.person_offsets = writable(self.person_offsets)
+        self.person_offsets.append(self.person_offsets[-1])
+        self.component = writable(self.component)
+        self.component.append(p)
+        self.sizes = None
+        return p
+
+    def add_movie(self, movie_id):
+        """
+        Adds a movie with no stars and returns its int.
+        """
+        if movie_id in self.movie_index:
+            return self.movie_index[movie_id]
+        m = len(self.movie_ids)
+        self.movie_ids.append(movie_id)
+        self.movie_index[movie_id] = m
+        self.movie_offsets = writable(self.movie_offsets)
+        self.movie_offsets.append(self.movie_offsets[-1])
+        return m
+
+    def add_star(self, p, m):
+        """
+        Records that person p starred in movie m, and merges the
+        components of p and the rest of the cast. The caller makes
+        sure the edge is new.
+        """
+        costars = self.stars_of(m)
+        self.extra_movies.setdefault(p, []).append(m)
+        self.extra_stars.setdefault(m, []).append(p)
+        if len(costars):
+            self.union(p, costars[0])
+
+    def union(self, p, q):
+        """
+        Merges the components of p and q.
+        """
+        p = self.find(p)
+        q = self.find(q)
+        if p == q:
+            return
+        if q < p:
+            p, q = q, p
+        self.component = writable(self.component)
+        self.component[q] = p
+        self.sizes = None
+        self.merged = True
+
+    def compact(self):
+        """
+        Folds the extra edges into the CSR arrays, and points every
+        person straight at their root again after unions, so find
+        chains do not grow with each batch of added edges.
+        """
+        if self.merged:
+            component = self.component
+            for p in range(len(component)):
+                component[p] = self.find(p)
+            self.merged = False
+        if self.extra_movies:
+            self.person_offsets, self.person_movies = merge(
+                self.person_offsets, self.person_movies, self.extra_movies
+            )
+            self.extra_movies = {}
+        if self.extra_stars:
+            self.movie_offsets, self.movie_stars = merge(
+                self.movie_offsets, self.movie_stars, self.extra_stars
+            )
+            self.extra_stars = {}
+
+    def neighbors(self, p):
+        """
+        Yields (movie, person) int pairs for people
+        who starred with person p.
+        """
+        for m in self.movies_of(p):
+            for q in self.stars_of(m):
+                yield m, q
+
+    def bidirectional_search(self, source, target):
+        """
+        Returns the shortest list of (movie, person) int pairs from
+        source to target, or None.
+        """
+        found = self.search([source], [target])
+        return None if found is None else found[1]
+
+    def search(self, sources, targets, movie_mask=None, person_mask=None):
+        """
+        Bidirectional BFS from a set of sources to a set of targets.
+        Expands the smaller frontier by one whole layer at a time and
+        stops when the frontiers meet. Returns (source, path) where
+        path is the shortest list of (movie, person) int pairs from
+        that source to any target, or None.
+
+        If given, movie_mask and person_mask are indexable by movie and
+        person int (see filters.EdgeFilter); movies and people whose
+        entry is false are never used.
+        """
+        self.expanded = 0
+        if person_mask is not None:
+            sources = [p for p in sources if person_mask[p]]
+            targets = [p for p in targets if person_mask[p]]
+        sources = set(sources)
+        targets = set(targets)
+        for p in sources:
+            if p in targets:
+                return p, []
+
+        # Components ignore the masks, but if no source shares a
+        # component with any target no filtered path can exist either
+        roots = {self.find(p) for p in targets}
+        if not any(self.find(p) in roots for p in sources):
+            return None
+
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        extra_movies = self.extra_movies
+        extra_stars = self.extra_stars
+
+        # person -> (movie, previous person) on the way from a source
+        forward = dict.fromkeys(sources)
+        # person -> (movie, next person) on the way to a target
+        backward = dict.fromkeys(targets)
+        forward_layer = list(sources)
+        backward_layer = list(targets)
+
+        meet = None
+        expanded = 0
+        while forward_layer and backward_layer and meet is None:
+            if len(forward_layer) <= len(backward_layer):
+                layer, seen, other = forward_layer, forward, backward
+            else:
+                layer, seen, other = backward_layer, backward, forward
+            next_layer = []
+            for u in layer:
+                expanded += 1
+                movies = person_movies[person_offsets[u]:
+                                       person_offsets[u + 1]]
+                if extra_movies and u in extra_movies:
+                    movies = [*movies, *extra_movies[u]]
+                for m in movies:
+                    if movie_mask is not None and not movie_mask[m]:
+                        continue
+                    stars = movie_stars[movie_offsets[m]:
+                                        movie_offsets[m + 1]]
+                    if extra_stars and m in extra_stars:
+                        stars = [*stars, *extra_stars[m]]
+                    for v in stars:
+                        if v in seen:
+                            continue
+                        if person_mask is not None and not person_mask[v]:
+                            continue
+                        seen[v] = (m, u)
+                        next_layer.append(v)
+                        if v in other:
+                            meet = v
+                            break
+                    if meet is not None:
+                        break
+                if meet is not None:
+                    break
+            if seen is forward:
+                forward_layer = next_layer
+            else:
+                backward_layer = next_layer
+
+        self.expanded = expanded
+        if meet is None:
+            return None
+        return join_path(forward, backward, meet)
+
+
+def csr(keys, members, index):
+    """
+    Builds (offsets, values) arrays listing, for every key in order,
+    the dense index of each of its members.
+    """
+    offsets = array("i", [0])
+    values = array("i")
+    lookup = index.__getitem__
+    for key in keys:
+        values.extend(sorted(map(lookup, members(key))))
+        offsets.append(len(values))
+    return offsets, values
+
+
+def merge(offsets, values, extra):
+    """
+    Returns new (offsets, values) CSR arrays with the lists in
+    extra appended to the matching rows.
+    """
+    new_offsets = array("i", [0])
+    new_values = array("i")
+    for key in range(len(offsets) - 1):
+        new_values.extend(values[offsets[key]:offsets[key + 1]])
+        if key in extra:
+            new_values.extend(extra[key])
+        new_offsets.append(len(new_values))
+    return new_offsets, new_values
+
+
+def writable(values):
+    """
+    Returns values as an array that can be appended to and changed;
+    arrays memory-mapped from a snapshot are read-only views.
+    """
+    if isinstance(values, array):
+        return values
+    copy = array("i")
+    copy.frombytes(values.cast("B"))
+    return copy
+
+
+def join_path(forward, backward, meet):
+    """
+    Stitches the two halves of a bidirectional search together.
+    Returns (source, path) with path a list of (movie, person) pairs.
+    """
+    path = []
+    now = meet
+    while forward[now] is not None:
+        m, previous = forward[now]
+        path.append((m, now))
+        now = previous
+    path.reverse()
+    source = now
+    now = meet
+    while backward[now] is not None:
+        m, following = backward[now]
+        path.append((m, following))
+        now = following
+    return source, path
@@ -0,0 +1,244 @@
+"""
+Landmark distance index for degrees.
+
+Runs a single-source BFS from each of a few landmark people and keeps
+the distance from every person to every landmark. That gives:
+
+  - exact "degrees only" answers in O(1) when either end of a query
+    is a landmark, and
+  - ALT lower bounds |d(L, t) - d(L, v)| that let an A* search prune
+    people who cannot be on a shortest path.
+
+Build the index offline with
+
+    python landmarks.py large [--count 16] [--people id id ...]
+
+which writes degrees.landmarks next to the CSV files. degrees.load_data
+picks it up automatically as long as the CSV files did not change.
+"""
+
+import argparse
+import heapq
+import os
+import pickle
+from array import array
+from collections import deque
+
+import snapshot
+
+VERSION = 2
+FILENAME = "degrees.landmarks"
+
+# Distance stored for people a landmark cannot reach
+UNREACHABLE = -1
+
+
+class LandmarkIndex():
+
+    def __init__(self, landmarks, distances):
+        # Person ints of the landmarks, and for each landmark an array
+        # with the distance from it to every person
+        self.landmarks = landmarks
+        self.distances = distances
+        self.position = {p: i for i, p in enumerate(landmarks)}
+
+    @classmethod
+    def build(cls, graph, landmarks):
+        """
+        Runs a BFS over the graph from every landmark.
+        """
+        return cls(list(landmarks),
+                   [distances_from(graph, p) for p in landmarks])
+
+    def distance(self, source, target):
+        """
+        Returns the exact number of degrees between source and target
+        if one of them is a landmark, -1 if they are not connected,
+        or None if the index cannot answer.
+        """
+        if source in self.position:
+            return self.distances[self.position[source]][target]
+        if target in self.position:
+            return self.distances[self.position[target]][source]
+        return None
+
+    def lower_bound(self, v, target):
+        """
+        Returns a lower bound on the degrees between v and target,
+        or None if some landmark proves they are not connected.
+        """
+        bound = 0
+        for distances in self.distances:
+            dv = distances[v]
+            dt = distances[target]
+            if (dv == UNREACHABLE) != (dt == UNREACHABLE):
+                return None
+            if dv != UNREACHABLE and abs(dt - dv) > bound:
+                bound = abs(dt - dv)
+        return bound
+
+    def save(self, path, directory, graph):
+        """
+        Writes the index, tagged with the fingerprints of the CSV
+        files in `directory` so stale indexes are never used.
+        """
+        data = {
+            "version": VERSION,
+            "sources": {
+                name: snapshot.fingerprint(os.path.join(directory, name),
+                                           with_hash=False)
+                for name in snapshot.SOURCES
+            },
+            "deltas": graph.deltas,
+            "landmarks": [graph.person_ids[p] for p in self.landmarks],
+            "distances": [distances.tobytes() for distances in self.distances]
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, directory, graph):
+        """
+        Loads an index written by save, or returns None if there is
+        none or the CSV files or applied deltas changed since it was
+        built.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if (data.get("version") != VERSION
+                or data.get("deltas") != graph.deltas
+                or not snapshot.is_fresh(directory, data)):
+            return None
+        distances = []
+        for blob in data["distances"]:
+            column = array("h")
+            column.frombytes(blob)
+            if len(column) != len(graph.person_ids):
+                return None
+            distances.append(column)
+        landmarks = [graph.person_index[p] for p in data["landmarks"]]
+        return cls(landmarks, distances)
+
+
+def distances_from(graph, source):
+    """
+    Returns an array with the BFS distance from source to every person.
+    """
+    movies_of = graph.movies_of
+    stars_of = graph.stars_of
+
+    distances = array("h", [UNREACHABLE]) * len(graph.person_ids)
+    distances[source] = 0
+    queue = deque([source])
+    while queue:
+        u = queue.popleft()
+        d = distances[u] + 1
+        for m in movies_of(u):
+            for v in stars_of(m):
+                if distances[v] == UNREACHABLE:
+                    distances[v] = d
+                    queue.append(v)
+    return distances
+
+
+def choose_landmarks(graph, count):
+    """
+    Picks the `count` people who starred in the most movies;
+    well-connected people give the tightest bounds.
+    """
+    people = range(len(graph.person_ids))
+    return heapq.nlargest(count, people,
+                          key=lambda p: len(graph.movies_of(p)))
+
+
+def astar_search(graph, index, source, target):
+    """
+    A* search guided by the landmark lower bounds. Returns the shortest
+    list of (movie, person) int pairs from source to target, or None.
+    """
+    graph.expanded = 0
+    if source == target:
+        return []
+    if not graph.connected(source, target):
+        return None
+    bound = index.lower_bound(source, target)
+    if bound is None:
+        return None
+
+    movies_of = graph.movies_of
+    stars_of = graph.stars_of
+
+    # person -> (movie, previous person)
+    parent = {source: None}
+    cost = {source: 0}
+    closed = set()
+    frontier = [(bound, 0, source)]
+    while frontier:
+        _, g, u = heapq.heappop(frontier)
+        if u == target:
+            break
+        if u in closed:
+            continue
+        closed.add(u)
+        graph.expanded = len(closed)
+        g += 1
+        for m in movies_of(u):
+            for v in stars_of(m):
+                if v in closed or cost.get(v, g + 1) <= g:
+                    continue
+                h = index.lower_bound(v, target)
+                if h is None:
+                    continue
+                cost[v] = g
+                parent[v] = (m, u)
+                heapq.heappush(frontier, (g + h, g, v))
+    else:
+        return None
+
+    path = []
+    now = target
+    while parent[now] is not None:
+        m, previous = parent[now]
+        path.append((m, now))
+        now = previous
+    path.reverse()
+    return path
+
+
+def main():
+    import degrees
+
+    parser = argparse.ArgumentParser(
+        description="Build the landmark distance index for degrees."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--count", type=int, default=16,
+                        help="number of best-connected people to use")
+    parser.add_argument("--people", nargs="*", default=[],
+                        help="IMDB ids of extra landmark people")
+    args = parser.parse_args()
+
+    print("Loading data...")
+    degrees.load_data(args.directory, landmarks=False)
+    graph = degrees.graph
+    print("Data loaded.")
+
+    chosen = choose_landmarks(graph, args.count)
+    for person_id in args.people:
+        p = graph.person_index[person_id]
+        if p not in chosen:
+            chosen.append(p)
+
+    index = LandmarkIndex.build(graph, chosen)
+    path = os.path.join(args.directory, FILENAME)
+    index.save(path, args.directory, graph)
+    print(f"Wrote {len(chosen)} landmarks to {path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Fuzzy name lookup for degrees.
+
+NameIndex is built once from the lowercase keys of degrees.names and
+answers "did you mean" queries with ranked candidates:
+
+  - prefix matches come from a sorted array of names searched with
+    bisect, which is a trie flattened into one list, and
+  - typos are caught by a trigram index: names sharing the most
+    trigrams with the query are re-ranked by edit distance.
+"""
+
+from bisect import bisect_left, insort
+from collections import Counter
+
+# Upper bound on trigram postings scanned per search
+POSTINGS_BUDGET = 5000
+
+
+class NameIndex():
+
+    def __init__(self, names):
+        # Names in insertion order, and sorted for prefix searches
+        self.names = list(names)
+        self.keys = sorted(self.names)
+
+        # trigram -> positions in self.names of the names containing it
+        self.grams = {}
+        for i, key in enumerate(self.names):
+            for gram in set(trigrams(key)):
+                self.grams.setdefault(gram, []).append(i)
+
+    def add(self, key):
+        """
+        Adds a new lowercase name to the index.
+        """
+        i = len(self.names)
+        self.names.append(key)
+        insort(self.keys, key)
+        for gram in set(trigrams(key)):
+            self.grams.setdefault(gram, []).append(i)
+
+    def prefix(self, text, limit=10):
+        """
+        Returns up to `limit` names starting with text.
+        """
+        text = text.lower()
+        matches = []
+        i = bisect_left(self.keys, text)
+        while (i < len(self.keys) and len(matches) < limit
+               and self.keys[i].startswith(text)):
+            matches.append(self.keys[i])
+            i += 1
+        return matches
+
+    def search(self, text, limit=5, max_distance=None):
+        """
+        Returns up to `limit` names closest to text, best first.
+        Names are ranked by edit distance, then by whether they
+        start with text, then alphabetically.
+        """
+        text = text.lower().strip()
+        if not text:
+            return []
+        if max_distance is None:
+            max_distance = max(2, len(text) // 3)
+
+        # Shortlist names by shared trigrams; only the shortlist gets
+        # the (comparatively slow) edit distance computation. Common
+        # trigrams say little about a name but have huge posting
+        # lists, so count the rarest ones first and stop at a budget.
+        postings = sorted((self.grams.get(gram, ())
+                           for gram in set(trigrams(text))), key=len)
+        shared = Counter()
+        budget = POSTINGS_BUDGET
+        for i, posting in enumerate(postings):
+            if i > 0 and len(posting) > budget:
+                break
+            shared.update(posting)
+            budget -= len(posting)
+        shortlist = {self.names[i] for i, _ in shared.most_common(limit * 10)}
+        shortlist.update(self.prefix(text, limit))
+
+        ranked = []
+        for key in shortlist:
+            if key.startswith(text):
+                ranked.append((0, 0, key))
+                continue
+            distance = edit_distance(text, key, max_distance)
+            if distance <= max_distance:
+                ranked.append((distance, 1, key))
+        ranked.sort()
+        return [key for _, _, key in ranked[:limit]]
+
+
+def trigrams(text):
+    """
+    Returns the trigrams of text, padded so that short names
+    and word boundaries produce trigrams too.
+    """
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between a and b, giving up early (and
+    returning limit + 1) once it must exceed limit. Only the band of
+    cells within `limit` of the diagonal is computed.
+    """
+    far = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return far
+    previous = [j if j <= limit else far for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [far] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return far
+        previous = current
+    return min(previous[-1], far)
@@ -0,0 +1,190 @@
+"""
+Path enumeration over the compact degrees graph.
+
+All functions take a graph.Graph and person ints, and paths use the
+same (movie, person) int pair format as Graph.bidirectional_search.
+Two paths through the same people but different movies are different
+paths, just as they print differently in degrees.main.
+"""
+
+import heapq
+from collections import deque
+
+
+def layers(graph, source, target):
+    """
+    Runs a BFS from source that stops once the layer holding target
+    is reached. Returns (distance, count) dicts for the people seen,
+    where count[v] is the number of shortest paths from source to v.
+    Returns None if target cannot be reached.
+    """
+    if not graph.connected(source, target):
+        return None
+
+    movies_of = graph.movies_of
+    stars_of = graph.stars_of
+
+    distance = {source: 0}
+    count = {source: 1}
+    layer = [source]
+    while layer and target not in distance:
+        next_layer = []
+        d = distance[layer[0]] + 1
+        for u in layer:
+            paths = count[u]
+            for m in movies_of(u):
+                for v in stars_of(m):
+                    seen = distance.get(v)
+                    if seen is None:
+                        distance[v] = d
+                        count[v] = paths
+                        next_layer.append(v)
+                    elif seen == d:
+                        count[v] += paths
+        layer = next_layer
+    if target not in distance:
+        return None
+    return distance, count
+
+
+def count_shortest_paths(graph, source, target):
+    """
+    Returns the number of distinct shortest paths from source to
+    target, 0 if they are not connected.
+    """
+    if source == target:
+        return 1
+    found = layers(graph, source, target)
+    if found is None:
+        return 0
+    return found[1][target]
+
+
+def all_shortest_paths(graph, source, target):
+    """
+    Lazily yields every shortest path from source to target.
+    Only the BFS distances are kept; the paths themselves are walked
+    back from the target one at a time.
+    """
+    if source == target:
+        yield []
+        return
+    found = layers(graph, source, target)
+    if found is None:
+        return
+    distance = found[0]
+
+    # Depth-first walk from the target down the BFS layers; each stack
+    # entry is (person, iterator over its (movie, person) neighbors
+    # one layer closer to the source)
+    def closer(v):
+        d = distance[v] - 1
+        return ((m, u) for m, u in graph.neighbors(v)
+                if distance.get(u) == d)
+
+    suffix = []
+    stack = [(target, closer(target))]
+    while stack:
+        v, steps = stack[-1]
+        step = next(steps, None)
+        if step is None:
+            stack.pop()
+            if suffix:
+                suffix.pop()
+            continue
+        m, u = step
+        # the edge u -> v is taken with movie m
+        suffix.append((m, v))
+        if u == source:
+            yield suffix[::-1]
+            suffix.pop()
+        else:
+            stack.append((u, closer(u)))
+
+
+def restricted_search(graph, source, target, banned_people, banned_steps):
+    """
+    BFS from source to target that never visits banned_people and
+    never takes a (movie, person) step in banned_steps out of source.
+    Returns a path or None.
+    """
+    movies_of = graph.movies_of
+    stars_of = graph.stars_of
+
+    parent = {source: None}
+    queue = deque([source])
+    expanded = 0
+    while queue:
+        u = queue.popleft()
+        expanded += 1
+        for m in movies_of(u):
+            for v in stars_of(m):
+                if v in parent or v in banned_people:
+                    continue
+                if u == source and (m, v) in banned_steps:
+                    continue
+                parent[v] = (m, u)
+                if v == target:
+                    graph.expanded = expanded
+                    path = []
+                    while parent[v] is not None:
+                        m, u = parent[v]
+                        path.append((m, v))
+                        v = u
+                    path.reverse()
+                    return path
+                queue.append(v)
+    graph.expanded = expanded
+    return None
+
+
+def k_shortest_paths(graph, source, target):
+    """
+    Lazily yields simple paths (no person repeated) from source to
+    target in order of length, using Yen's algorithm. Stop iterating
+    once enough paths have been seen; nothing past that is computed.
+    """
+    if source == target:
+        yield []
+        return
+    if not graph.connected(source, target):
+        return
+    first = restricted_search(graph, source, target, set(), set())
+    if first is None:
+        return
+
+    found = [first]
+    seen = {tuple(first)}
+    candidates = []
+    counter = 0
+    while True:
+        path = found[-1]
+        yield path
+
+        # Person ints along the path, starting with the source
+        nodes = [source] + [p for _, p in path]
+        for i in range(len(path)):
+            spur = nodes[i]
+            root = path[:i]
+
+            # Steps out of the spur node used by earlier paths
+            # sharing this root must not be taken again
+            banned_steps = {
+                other[i] for other in found
+                if len(other) > i and other[:i] == root
+            }
+            banned_people = set(nodes[:i])
+            spur_path = restricted_search(graph, spur, target,
+                                          banned_people, banned_steps)
+            if spur_path is None:
+                continue
+            candidate = root + spur_path
+            key = tuple(candidate)
+            if key not in seen:
+                seen.add(key)
+                counter += 1
+                heapq.heappush(candidates, (len(candidate), counter,
+                                            candidate))
+        if not candidates:
+            return
+        found.append(heapq.heappop(candidates)[2])
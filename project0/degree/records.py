@@ -0,0 +1,158 @@
+"""
+Compact records for the people and movies loaded by degrees.
+
+A dict per row costs a hash table for three keys; these records keep
+the same fields in __slots__ and still support record["name"] style
+access, so code written against the original dicts keeps working.
+They live in their own module so that pickled snapshots refer to
+records.Person rather than to whichever script did the loading.
+
+LazyRecords stands in for the people or movies dict when the data comes
+from a snapshot, building each record on first use instead of all of
+them at startup.
+"""
+
+from collections.abc import Mapping
+
+
+class Record():
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{key}={getattr(self, key)!r}" for key in self.__slots__
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+class Person(Record):
+    __slots__ = ("name", "birth", "movies")
+
+    def __init__(self, name, birth, movies=None):
+        self.name = name
+        self.birth = birth
+        self.movies = set() if movies is None else movies
+
+
+class Movie(Record):
+    __slots__ = ("title", "year", "stars")
+
+    def __init__(self, title, year, stars=None):
+        self.title = title
+        self.year = year
+        self.stars = set() if stars is None else stars
+
+
+class LazyRecords(Mapping):
+    """
+    Maps ids to records like the people and movies dicts, but builds
+    each record only when it is first looked up, from the columns a
+    snapshot stores and the links in the compact graph.
+
+    columns hold the leading fields of cls (name and birth, or title
+    and year) for the ids stored, which are the first ones of `ids`,
+    the graph's dense id list, with `index` its id -> int dict.
+    links(i) returns the set of ids for the last field. Records set
+    later, as add_person and add_movie do, are kept as given, and a
+    built record is never rebuilt, so changes to it stay.
+    """
+
+    def __init__(self, cls, columns, links, ids, index):
+        self.cls = cls
+        self.fields = cls.__slots__[:len(columns)]
+        self.stored_columns = columns
+        self.count = len(columns[0])
+        self.links = links
+        self.ids = ids
+        self.index = index
+        self.built = {}
+        # ids set after loading, with no stored row, in order
+        self.added = {}
+
+    def stored(self, key):
+        return self.index.get(key, self.count) < self.count
+
+    def __getitem__(self, key):
+        record = self.built.get(key)
+        if record is None:
+            if not self.stored(key):
+                raise KeyError(key)
+            i = self.index[key]
+            record = self.built[key] = self.cls(
+                *[column[i] for column in self.stored_columns],
+                self.links(i)
+            )
+        return record
+
+    def __setitem__(self, key, record):
+        if not self.stored(key):
+            self.added[key] = None
+        self.built[key] = record
+
+    def __contains__(self, key):
+        return key in self.built or self.stored(key)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.ids[i]
+        yield from self.added
+
+    def __len__(self):
+        return self.count + len(self.added)
+
+    def field(self, key, field):
+        """
+        Returns record[field] for key, from the stored column when the
+        record is not built yet, so looking at one field of every
+        record does not build them all.
+        """
+        record = self.built.get(key)
+        if record is None and field in self.fields and self.stored(key):
+            i = self.fields.index(field)
+            return self.stored_columns[i][self.index[key]]
+        return getattr(self[key], field)
+
+    def columns(self):
+        """
+        Returns the current values of the stored fields, one list per
+        field, without building the records not built yet.
+        """
+        columns = [[] for _ in self.fields]
+        for i, key in enumerate(self):
+            record = self.built.get(key)
+            for field, stored, column in zip(self.fields,
+                                             self.stored_columns, columns):
+                column.append(stored[i] if record is None
+                              else getattr(record, field))
+        return columns
+
+
+def field(records, key, field):
+    """
+    Returns records[key][field] for a records dict or LazyRecords,
+    without building a lazy record only for it.
+    """
+    if isinstance(records, LazyRecords):
+        return records.field(key, field)
+    return getattr(records[key], field)
+
+
+def columns(records, fields):
+    """
+    Returns the values of fields over a records dict or LazyRecords,
+    one list per field, in order.
+    """
+    if isinstance(records, LazyRecords):
+        return records.columns()
+    return [[getattr(record, field) for record in records.values()]
+            for field in fields]
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+from graph import Graph
+from records import LazyRecords, Movie, Person, columns
+
+# Bump VERSION whenever the layout below changes
+MAGIC = b"DEGSNAP\0"
+VERSION = 6
+SOURCES = ["people.csv", "movies.csv", "stars.csv"]
+FILENAME = "degrees.snapshot"
+
+# Names of the Graph attributes stored as raw int arrays
+ARRAYS = ["person_offsets", "person_movies", "movie_offsets", "movie_stars",
+          "component"]
+
+# File layout:
+#
+#     MAGIC | uint32 header length | JSON header | padding
+#     | int arrays, each aligned to 8 bytes | pickled metadata
+#
+# The header records the version, byte order and item size, a
+# fingerprint of every source CSV, and where each array and the pickled
+# metadata live. The metadata is (names, person columns, movie columns,
+# person_ids, movie_ids, deltas): the columns are the names and births
+# of the people and the titles and years of the movies, in graph order.
+# Who starred in what is already in the arrays, so the records are
+# built from both on first use (see records.LazyRecords) rather than
+# all unpickled at startup. The deltas applied on top of the CSVs go
+# in the pickle rather than the header, as their list grows with
+# every update.
+
+
+def path_for(directory):
+    return os.path.join(directory, FILENAME)
+
+
+def fingerprint(path, with_hash=True):
+    """
+    Returns [size, mtime_ns, sha1] for a file.
+    The sha1 is only computed if with_hash is set.
+    """
+    stat = os.stat(path)
+    digest = None
+    if with_hash:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+    return [stat.st_size, stat.st_mtime_ns, digest]
+
+
+def save(directory, names, people, movies, graph):
+    """
+    Writes a snapshot of the loaded data next to the CSV files.
+    The file is written under a temporary name and renamed into
+    place, so a crash never leaves a half-written snapshot behind.
+    Edges added since the graph was built are folded into the arrays
+    first.
+    """
+    graph.compact()
+    sources = {
+        name: fingerprint(os.path.join(directory, name)) for name in SOURCES
+    }
+    # people and movies are in the same order as the graph's ids, as
+    # both are only ever appended to together
+    meta = pickle.dumps(
+        (names, columns(people, ("name", "birth")),
+         columns(movies, ("title", "year")),
+         graph.person_ids, graph.movie_ids, graph.deltas),
+        protocol=pickle.HIGHEST_PROTOCOL
+    )
+    blobs = [getattr(graph, name) for name in ARRAYS]
+    itemsize = blobs[0].itemsize
+
+    # The header size depends on the offsets it contains, so lay out
+    # the body with a generous fixed-size header slot
+    header_slot = 4096
+    offset = len(MAGIC) + 4 + header_slot
+    arrays = {}
+    for name, blob in zip(ARRAYS, blobs):
+        arrays[name] = [offset, len(blob)]
+        offset = align(offset + len(blob) * itemsize)
+    header = json.dumps({
+        "version": VERSION,
+        "byteorder": sys.byteorder,
+        "itemsize": itemsize,
+        "sources": sources,
+        "arrays": arrays,
+        "meta": [offset, len(meta)],
+    }).encode("utf-8")
+    if len(header) > header_slot:
+        raise ValueError("snapshot header too large")
+
+    path = path_for(directory)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header.ljust(header_slot, b" "))
+        for name, blob in zip(ARRAYS, blobs):
+            start, _ = arrays[name]
+            f.write(b"\0" * (start - f.tell()))
+            f.write(memoryview(blob).cast("B"))
+        f.write(b"\0" * (offset - f.tell()))
+        f.write(meta)
+    os.replace(tmp, path)
+
+
+def load(directory, verify=False):
+    """
+    Memory-maps the snapshot for `directory` and returns
+    (names, people, movies, graph), or None if there is no snapshot
+    or it is stale. A snapshot is stale when its version differs or
+    the size or mtime of any CSV changed. The sha1 of a CSV is checked
+    too when it was changed or modified after the snapshot was written
+    (see is_fresh), and for every CSV with verify=True.
+
+    people and movies are returned as LazyRecords.
+    """
+    path = path_for(directory)
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        written = os.fstat(f.fileno()).st_mtime_ns
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return None
+
+    header = read_header(buffer)
+    if header is None or not is_fresh(directory, header, verify, written):
+        buffer.close()
+        return None
+
+    start, length = header["meta"]
+    (names, person_columns, movie_columns,
+     person_ids, movie_ids, deltas) = pickle.loads(
+        buffer[start:start + length]
+    )
+    view = memoryview(buffer)
+    arrays = []
+    for name in ARRAYS:
+        start, count = header["arrays"][name]
+        end = start + count * header["itemsize"]
+        arrays.append(view[start:end].cast("i"))
+    graph = Graph(person_ids, movie_ids, *arrays)
+    graph.deltas = deltas
+    people = LazyRecords(
+        Person, person_columns,
+        lambda p: {graph.movie_ids[m] for m in graph.movies_of(p)},
+        graph.person_ids, graph.person_index
+    )
+    movies = LazyRecords(
+        Movie, movie_columns,
+        lambda m: {graph.person_ids[p] for p in graph.stars_of(m)},
+        graph.movie_ids, graph.movie_index
+    )
+
+    # Keep the mapping alive for as long as the graph uses it
+    graph.buffer = buffer
+    return names, people, movies, graph
+
+
+def read_header(buffer):
+    """
+    Returns the decoded header, or None if the file is not
+    a snapshot this version can read.
+    """
+    prefix = len(MAGIC) + 4
+    if len(buffer) < prefix or buffer[:len(MAGIC)] != MAGIC:
+        return None
+    (length,) = struct.unpack("<I", buffer[len(MAGIC):prefix])
+    try:
+        header = json.loads(buffer[prefix:prefix + length])
+    except ValueError:
+        return None
+    if (header.get("version") != VERSION
+            or header.get("byteorder") != sys.byteorder
+            or header.get("itemsize") != struct.calcsize("i")):
+        return None
+    return header
+
+
+def is_fresh(directory, header, verify=False, written=None):
+    """
+    Checks the recorded fingerprints against the CSV files on disk.
+
+    With verify=True the sha1 of every CSV is checked as well. Given
+    `written`, the mtime of the snapshot in ns, so is the sha1 of any
+    CSV changed (by ctime) or modified no earlier than that: an edit
+    then may have kept the recorded size and mtime, as when the mtime
+    is restored or falls in the same clock tick as the write.
+    """
+    for name in SOURCES:
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        recorded = header["sources"].get(name)
+        if (recorded is None
+                or [stat.st_size, stat.st_mtime_ns] != recorded[:2]):
+            return False
+        suspect = written is not None and (
+            stat.st_ctime_ns >= written or stat.st_mtime_ns >= written
+        )
+        if (verify or suspect) and fingerprint(path)[2] != recorded[2]:
+            return False
+    return True
+
+
+def align(offset, to=8):
+    return (offset + to - 1) // to * to
@@ -0,0 +1,44 @@
+"""
+Applies daily delta files to the degrees data without a full reload.
+
+    python update.py large deltas/2026-10-17 deltas/2026-10-18
+
+Each delta directory may hold any of people.csv, movies.csv and
+stars.csv in the same format as the data. The deltas are applied to
+the snapshot kept next to the data (see snapshot.py), so later runs
+of degrees.py see them without re-parsing anything, and recorded in
+the delta log there, so they are applied again whenever the snapshot
+is rebuilt from changed CSV files. Rebuild the landmark index
+afterwards if you use one.
+"""
+
+import sys
+
+import degrees
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.exit("Usage: python update.py directory delta [delta ...]")
+    directory = sys.argv[1]
+
+    print("Loading data...")
+    degrees.load_data(directory, landmarks=False, fuzzy=False)
+    print("Data loaded.")
+
+    failed = False
+    for delta in sys.argv[2:]:
+        report = degrees.ingest_delta(delta)
+        if report.get("skipped"):
+            print(f"{delta}: already applied, skipped.")
+            continue
+        print(f"{delta}: added {report['people']} people, "
+              f"{report['movies']} movies, {report['stars']} stars.")
+        for problem in report["problems"]:
+            print(f"    {problem}")
+        failed = failed or bool(report["problems"])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Reduced ordered binary decision diagrams for logic sentences.
+
+A BDD manager turns sentences into canonical graphs over a fixed order
+of symbols: two sentences are equivalent exactly when they build the
+same node. Once built, entailment, model counting and finding the
+symbols a knowledge base forces take time polynomial in the size of the
+graph rather than exponential in the number of symbols:
+
+    manager = BDD()
+    kb = manager.build(knowledge)
+    manager.entails(kb, manager.build(query))
+    manager.count(kb)
+    manager.forced(kb)
+
+or simply model_check(knowledge, query, backend="bdd").
+
+Nodes are ints: FALSE and TRUE are the terminals, every other node
+tests the symbol at its level and has a low (false) and high (true)
+child. Symbols get levels in the order they are first met.
+"""
+
+from collections import OrderedDict
+
+import logic
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+
+FALSE = 0
+TRUE = 1
+
+# Entries kept in the ite cache before the least recently used go
+CACHE_SIZE = 1 << 18
+
+
+class BDD():
+
+    def __init__(self, order=(), cache_size=CACHE_SIZE):
+        # Symbol names by level, and level by name
+        self.order = []
+        self.levels = {}
+
+        # Node -> level, low child, high child; the terminals sit
+        # below every level
+        self.level = [float("inf"), float("inf")]
+        self.low = [FALSE, TRUE]
+        self.high = [FALSE, TRUE]
+
+        # (level, low, high) -> node, so every function has one node
+        self.unique = {}
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+        # sentence -> node, and the Ands built into it; kept across
+        # logic generations until one of those Ands changes
+        self.built = {}
+        self.ands = logic.AndCounts()
+        self.generation = logic._generation
+
+        for name in order:
+            self.variable(name)
+
+    def variable(self, name):
+        """Returns the node of the symbol called name."""
+        level = self.levels.get(name)
+        if level is None:
+            level = self.levels[name] = len(self.order)
+            self.order.append(name)
+        return self.node(level, FALSE, TRUE)
+
+    def node(self, level, low, high):
+        """Returns the node testing level, reduced and shared."""
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = self.unique[key] = len(self.low)
+            self.level.append(level)
+            self.low.append(low)
+            self.high.append(high)
+        return node
+
+    def ite(self, f, g, h):
+        """Returns the node of "if f then g else h"."""
+        # Depth-first with an explicit stack, as the recursion would go
+        # one level deeper per symbol: ("call", key) asks for a node,
+        # ("make", key, level) joins the two nodes last found below it
+        cache = self.cache
+        found = []
+        stack = [("call", (f, g, h))]
+        while stack:
+            task = stack.pop()
+            key = task[1]
+            if task[0] == "make":
+                high = found.pop()
+                low = found.pop()
+                node = self.node(task[2], low, high)
+                cache[key] = node
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+                found.append(node)
+                continue
+
+            node = self.terminal(*key)
+            if node is None:
+                node = cache.get(key)
+                if node is not None:
+                    cache.move_to_end(key)
+            if node is not None:
+                found.append(node)
+                continue
+            level = min(self.level[u] for u in key)
+            stack.append(("make", key, level))
+            stack.append(("call", tuple(self.cofactor(u, level, True)
+                                        for u in key)))
+            stack.append(("call", tuple(self.cofactor(u, level, False)
+                                        for u in key)))
+        return found.pop()
+
+    @staticmethod
+    def terminal(f, g, h):
+        """Returns ite(f, g, h) if it needs no work, or None."""
+        if f == TRUE:
+            return g
+        if f == FALSE:
+            return h
+        if g == h:
+            return g
+        if g == TRUE and h == FALSE:
+            return f
+        return None
+
+    def cofactor(self, u, level, value):
+        """Returns u with the symbol at level set to value."""
+        if self.level[u] != level:
+            return u
+        return self.high[u] if value else self.low[u]
+
+    def negate(self, f):
+        return self.ite(f, FALSE, TRUE)
+
+    def conjoin(self, f, g):
+        return self.ite(f, g, FALSE)
+
+    def disjoin(self, f, g):
+        return self.ite(f, TRUE, g)
+
+    def build(self, sentence):
+        """Returns the node of sentence, adding its symbols if needed."""
+        if self.generation != logic._generation:
+            self.generation = logic._generation
+            if self.ands.changed():
+                self.built = {}
+                self.ands = logic.AndCounts()
+        # Operands are built before the sentences using them, so
+        # construct finds them in self.built and deep sentences need
+        # no recursion
+        built = self.built
+        stack = [(sentence, False)]
+        while stack:
+            item, ready = stack.pop()
+            if item in built:
+                continue
+            if ready:
+                built[item] = self.construct(item)
+            else:
+                stack.append((item, True))
+                stack.extend((operand, False)
+                             for operand in reversed(item.operands()))
+        return built[sentence]
+
+    def construct(self, sentence):
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        if isinstance(sentence, Not):
+            return self.negate(self.build(sentence.operand))
+        if isinstance(sentence, And):
+            self.ands.record(sentence)
+            node = TRUE
+            for conjunct in sentence.conjuncts:
+                node = self.conjoin(node, self.build(conjunct))
+            return node
+        if isinstance(sentence, Or):
+            node = FALSE
+            for disjunct in sentence.disjuncts:
+                node = self.disjoin(node, self.build(disjunct))
+            return node
+        if isinstance(sentence, Implication):
+            return self.ite(self.build(sentence.antecedent),
+                            self.build(sentence.consequent), TRUE)
+        if isinstance(sentence, Biconditional):
+            left = self.build(sentence.left)
+            right = self.build(sentence.right)
+            return self.ite(left, right, self.negate(right))
+        raise TypeError(f"cannot build {type(sentence).__name__}")
+
+    def entails(self, f, g):
+        """Checks if every model of f is a model of g."""
+        return self.ite(f, g, TRUE) == TRUE
+
+    def nodes(self, f):
+        """Returns the nodes reachable from f, children before parents."""
+        order = []
+        seen = {FALSE, TRUE}
+        stack = [(f, False)]
+        while stack:
+            u, expanded = stack.pop()
+            if expanded:
+                order.append(u)
+            elif u not in seen:
+                seen.add(u)
+                stack.append((u, True))
+                stack.append((self.high[u], False))
+                stack.append((self.low[u], False))
+        return order
+
+    def count(self, f):
+        """
+        Returns the number of models of f, over every symbol the
+        manager knows.
+        """
+        total = len(self.order)
+
+        def level(u):
+            return total if u <= TRUE else self.level[u]
+
+        # count[u]: models of u over the symbols from its level down
+        count = {FALSE: 0, TRUE: 1}
+        for u in self.nodes(f):
+            here = self.level[u]
+            low, high = self.low[u], self.high[u]
+            count[u] = (count[low] << (level(low) - here - 1)) + (
+                count[high] << (level(high) - here - 1))
+        return count[f] << level(f)
+
+    def forced(self, f):
+        """
+        Returns {name: value} for the symbols that have the same value
+        in every model of f, or None if f has no models.
+        """
+        if f == FALSE:
+            return None
+        total = len(self.order)
+        can = [[False, False] for _ in range(total)]
+
+        # Symbols skipped between a node and a child, or above the
+        # root, can take either value; mark them as +1/-1 differences
+        free = [0] * (total + 1)
+
+        def skip(start, end):
+            free[start] += 1
+            free[end] -= 1
+
+        skip(0, total if f == TRUE else self.level[f])
+        for u in self.nodes(f):
+            here = self.level[u]
+            for value, child in ((False, self.low[u]), (True, self.high[u])):
+                if child == FALSE:
+                    continue
+                can[here][value] = True
+                skip(here + 1, total if child == TRUE else self.level[child])
+
+        forced = {}
+        running = 0
+        for level, name in enumerate(self.order):
+            running += free[level]
+            if running:
+                continue
+            if can[level] == [False, True]:
+                forced[name] = True
+            elif can[level] == [True, False]:
+                forced[name] = False
+        return forced
+
+
+def entails(knowledge, query):
+    """Checks if knowledge base entails query."""
+    manager = BDD()
+    return manager.entails(manager.build(knowledge), manager.build(query))
@@ -0,0 +1,184 @@
+"""
+Model counting and probabilities over logic sentences.
+
+    count_models(knowledge)
+    weighted_count(knowledge, priors)
+    probability(query, knowledge, priors)
+
+count_models is the number of assignments to the symbols of a sentence
+that make it true. With priors, a dict from symbol name to the
+probability that the symbol is true (0.5 when not given), every model is
+weighted by the product of its symbols' probabilities, and probability
+gives P(query | knowledge) under those independent priors.
+
+Sentences are encoded into CNF with sat.Encoder. Its Tseitin variables
+are defined to be equivalent to sub-sentences, so every model of the
+sentence extends to exactly one model of the clauses and counts carry
+over unchanged. The clauses are counted by a #SAT search that
+propagates units, splits the clauses into independent components
+sharing no variables, and caches the count of every component it has
+seen, so the 2^n models are never enumerated one by one.
+"""
+
+from logic import And
+from sat import Clauses, Encoder
+
+
+class Counter():
+
+    def __init__(self, weights=None):
+        # variable -> (weight when false, weight when true); (1, 1)
+        # for variables not in it
+        self.weights = {} if weights is None else weights
+        # frozenset of clauses -> weighted count of its variables
+        self.cache = {}
+
+    def weight(self, literal):
+        return self.weights.get(abs(literal), (1, 1))[literal > 0]
+
+    def free(self, v):
+        false, true = self.weights.get(v, (1, 1))
+        return false + true
+
+    def count(self, clauses, variables):
+        """
+        Returns the weighted count of the assignments to variables (a
+        set holding at least the variables of clauses) that satisfy
+        every clause.
+        """
+        variables = set(variables)
+        total = 1
+        while True:
+            if any(not clause for clause in clauses):
+                return 0
+            unit = next((clause for clause in clauses if len(clause) == 1),
+                        None)
+            if unit is None:
+                break
+            literal, = unit
+            total *= self.weight(literal)
+            variables.discard(abs(literal))
+            clauses = condition(clauses, literal)
+
+        for component, used in components(clauses):
+            variables -= used
+            total *= self.component(component, used)
+            if not total:
+                return 0
+        for v in variables:
+            total *= self.free(v)
+        return total
+
+    def component(self, clauses, variables):
+        key = frozenset(clauses)
+        count = self.cache.get(key)
+        if count is None:
+            # Branch on the variable in the most clauses, counting short
+            # clauses more since setting it is likelier to force others
+            occurrences = {}
+            for clause in key:
+                score = 1 << (4 - min(len(clause), 4))
+                for literal in clause:
+                    v = abs(literal)
+                    occurrences[v] = occurrences.get(v, 0) + score
+            v = max(occurrences, key=occurrences.get)
+            rest = variables - {v}
+            count = (
+                self.weight(v) * self.count(condition(key, v), rest)
+                + self.weight(-v) * self.count(condition(key, -v), rest)
+            )
+            self.cache[key] = count
+        return count
+
+
+def condition(clauses, literal):
+    """Returns the clauses left once literal is true."""
+    result = []
+    for clause in clauses:
+        if literal in clause:
+            continue
+        if -literal in clause:
+            clause = clause - {-literal}
+        result.append(clause)
+    return result
+
+
+def components(clauses):
+    """
+    Yields (clauses, variables) for each group of clauses connected
+    through shared variables.
+    """
+    by_variable = {}
+    for i, clause in enumerate(clauses):
+        for literal in clause:
+            by_variable.setdefault(abs(literal), []).append(i)
+
+    seen = set()
+    for start in range(len(clauses)):
+        if start in seen:
+            continue
+        seen.add(start)
+        group = [start]
+        used = set()
+        for i in group:
+            for literal in clauses[i]:
+                v = abs(literal)
+                if v in used:
+                    continue
+                used.add(v)
+                for j in by_variable[v]:
+                    if j not in seen:
+                        seen.add(j)
+                        group.append(j)
+        yield [clauses[i] for i in group], used
+
+
+def weighted_count(sentence, priors=None, symbols=None):
+    """
+    Returns the sum over the models of sentence of the product of the
+    symbol weights: priors[name] when a symbol is true, 1 - priors[name]
+    when false. Symbols without a prior weigh 1 both ways, so without
+    priors this is the number of models. Counts are over the symbols of
+    sentence plus any extra `symbols`.
+    """
+    priors = {} if priors is None else priors
+    clauses = Clauses()
+    encoder = Encoder(clauses)
+    encoder.add(sentence)
+    weights = {}
+    for name in sentence.symbol_set():
+        v = encoder.variable(name)
+        if name in priors:
+            weights[v] = (1 - priors[name], priors[name])
+
+    counter = Counter(weights)
+    total = counter.count(clauses.clauses, range(1, clauses.count + 1))
+    for name in set(symbols or ()).difference(sentence.symbol_set()):
+        total *= 1 if name in priors else 2
+    return total
+
+
+def count_models(sentence, symbols=None):
+    """
+    Returns the number of assignments to the symbols of sentence, plus
+    any extra `symbols`, that make it true.
+    """
+    return weighted_count(sentence, None, symbols)
+
+
+def probability(query, knowledge=None, priors=None):
+    """
+    Returns P(query | knowledge) when every symbol is independently
+    true with its prior probability (0.5 by default).
+    """
+    priors = {} if priors is None else priors
+    symbols = query.symbol_set()
+    if knowledge is not None:
+        symbols |= knowledge.symbol_set()
+    priors = {name: priors.get(name, 0.5) for name in symbols}
+    if knowledge is None:
+        return weighted_count(query, priors)
+    evidence = weighted_count(knowledge, priors)
+    if not evidence:
+        raise ValueError("knowledge base has no models")
+    return weighted_count(And(knowledge, query), priors) / evidence
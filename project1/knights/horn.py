@@ -0,0 +1,187 @@
+"""
+Forward chaining for Horn knowledge bases.
+
+A Horn clause has at most one positive literal: a fact (A), a rule
+(A ∧ B => C) or a constraint (¬(A ∧ B), with no head). Entailment by a
+set of Horn clauses takes time linear in their size. Every clause keeps
+a counter of the premises not yet known true, and an agenda of
+symbols just derived brings counters down until no new rule fires.
+
+model_check finds the Horn conjuncts of a knowledge base by itself and
+tries them first:
+
+    horn.entails(knowledge, query)
+
+answers True when the Horn conjuncts alone entail the query, which then
+holds for the whole knowledge base too, and False when every conjunct
+is Horn and they do not. Otherwise it answers None, and the general
+checker decides. Queries are conjunctions of literals.
+"""
+
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+
+
+def symbols_of(sentence):
+    """
+    Returns the names in a conjunction of symbols, or None if sentence
+    is something else.
+    """
+    if isinstance(sentence, Symbol):
+        return [sentence.name]
+    if isinstance(sentence, And):
+        names = []
+        for conjunct in sentence.conjuncts:
+            more = symbols_of(conjunct)
+            if more is None:
+                return None
+            names.extend(more)
+        return names
+    return None
+
+
+def literals_of(sentence):
+    """
+    Returns the (name, value) pairs of a conjunction of literals, or
+    None if sentence is something else.
+    """
+    if isinstance(sentence, Symbol):
+        return [(sentence.name, True)]
+    if isinstance(sentence, Not) and isinstance(sentence.operand, Symbol):
+        return [(sentence.operand.name, False)]
+    if isinstance(sentence, And):
+        literals = []
+        for conjunct in sentence.conjuncts:
+            more = literals_of(conjunct)
+            if more is None:
+                return None
+            literals.extend(more)
+        return literals
+    return None
+
+
+def clauses(sentence):
+    """
+    Returns sentence as a list of Horn clauses (premises, head), head
+    None for constraints, or None if it is not a conjunction of Horn
+    clauses.
+    """
+    if isinstance(sentence, Symbol):
+        return [((), sentence.name)]
+    if isinstance(sentence, And):
+        result = []
+        for conjunct in sentence.conjuncts:
+            more = clauses(conjunct)
+            if more is None:
+                return None
+            result.extend(more)
+        return result
+    if isinstance(sentence, Implication):
+        premises = symbols_of(sentence.antecedent)
+        consequent = clauses(sentence.consequent)
+        if premises is None or consequent is None:
+            return None
+        return [((*premises, *more), head) for more, head in consequent]
+    if isinstance(sentence, Biconditional):
+        forward = clauses(Implication(sentence.left, sentence.right))
+        backward = clauses(Implication(sentence.right, sentence.left))
+        if forward is None or backward is None:
+            return None
+        return forward + backward
+    if isinstance(sentence, Or):
+        literals = [literals_of(disjunct) for disjunct in sentence.disjuncts]
+        if None in literals or any(len(l) != 1 for l in literals):
+            return None
+        heads = [name for (name, value), in literals if value]
+        if len(heads) > 1:
+            return None
+        premises = tuple(name for (name, value), in literals if not value)
+        return [(premises, heads[0] if heads else None)]
+    if isinstance(sentence, Not):
+        operand = sentence.operand
+        premises = symbols_of(operand)
+        if premises is not None:
+            return [(tuple(premises), None)]
+        if isinstance(operand, Not):
+            return clauses(operand.operand)
+        if isinstance(operand, Or):
+            return clauses(And(*[Not(d) for d in operand.disjuncts]))
+        if isinstance(operand, Implication):
+            return clauses(And(operand.antecedent, Not(operand.consequent)))
+    return None
+
+
+class Chainer():
+    """Horn clauses indexed for forward chaining."""
+
+    def __init__(self, horn):
+        # Premises of each clause, without repeats, and its head
+        self.premises = [frozenset(premises) for premises, _ in horn]
+        self.heads = [head for _, head in horn]
+        # Symbol -> clauses it is a premise of
+        self.uses = {}
+        for i, premises in enumerate(self.premises):
+            for name in premises:
+                self.uses.setdefault(name, []).append(i)
+
+    def derive(self, facts=()):
+        """
+        Returns the set of symbols the clauses and extra facts make
+        true, or None if they break a constraint.
+        """
+        count = [len(premises) for premises in self.premises]
+        agenda = list(facts)
+        for i, premises in enumerate(self.premises):
+            if not premises:
+                if self.heads[i] is None:
+                    return None
+                agenda.append(self.heads[i])
+
+        inferred = set()
+        while agenda:
+            name = agenda.pop()
+            if name in inferred:
+                continue
+            inferred.add(name)
+            for i in self.uses.get(name, ()):
+                count[i] -= 1
+                if not count[i]:
+                    if self.heads[i] is None:
+                        return None
+                    agenda.append(self.heads[i])
+        return inferred
+
+
+def entails(knowledge, query):
+    """
+    Returns True or False if forward chaining over the Horn conjuncts
+    of knowledge decides whether it entails query, else None.
+    """
+    horn = []
+    complete = True
+    conjuncts = [knowledge]
+    while conjuncts:
+        conjunct = conjuncts.pop()
+        if isinstance(conjunct, And):
+            conjuncts.extend(conjunct.conjuncts)
+            continue
+        more = clauses(conjunct)
+        if more is None:
+            complete = False
+        else:
+            horn.extend(more)
+
+    chainer = Chainer(horn)
+    inferred = chainer.derive()
+    if inferred is None:
+        # No model satisfies even the Horn part
+        return True
+    literals = literals_of(query)
+    if literals is None:
+        return None
+
+    # A negative literal is entailed when assuming the symbol breaks a
+    # constraint
+    if all(name in inferred if value else chainer.derive([name]) is None
+           for name, value in literals):
+        return True
+    return False if complete else None
@@ -1,19 +1,144 @@
+import functools
 import itertools
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Bumped whenever a sentence changes in place (And.add); cached hashes,
+# symbol sets and compiled forms from an older generation are thrown
+# away, since the changed sentence may be nested anywhere
+_generation = 0
+
+
+class _Cache():
+    """Data derived from one sentence, valid for one generation."""
+
+    # One small object instead of several lazily added attributes, which
+    # would force a full __dict__ onto every sentence
+    __slots__ = ("generation", "hash", "symbol_set", "compiled", "interner")
+
+    def __init__(self, interner=None):
+        self.generation = _generation
+        self.hash = self.symbol_set = self.compiled = None
+        self.interner = interner
+
+
+def _cached(method):
+    """Caches what a sentence method returns until the next And.add."""
+    name = method.__name__.strip("_")
+
+    @functools.wraps(method)
+    def cached(self):
+        cache = self._caches()
+        value = getattr(cache, name)
+        if value is None:
+            value = method(self)
+            setattr(cache, name, value)
+        return value
+    return cached
+
+
+def _union(sets):
+    """
+    Returns the union of frozensets, reusing the largest one when it
+    already holds the others, so nested sentences share symbol sets.
+    """
+    if not sets:
+        return frozenset()
+    largest = max(sets, key=len)
+    union = largest.union(*sets)
+    return largest if len(union) == len(largest) else union
 
 
 class Sentence():
 
+    # See _caches
+    _cache = None
+
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
 
     def formula(self):
         """Returns string formula representing logical sentence."""
-        return ""
+        # Expanded from a stack of strings and sentences, so the time is
+        # linear in the length and deep sentences need no recursion
+        out = []
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                out.append(item)
+            else:
+                stack.extend(reversed(item._pieces()))
+        return "".join(out)
+
+    def _pieces(self):
+        """Returns the strings and sentences the formula is made of."""
+        return []
+
+    def _bare(self):
+        """
+        Checks if the formula can be an operand without parentheses,
+        as parenthesize would decide from the string.
+        """
+        return True
+
+    @staticmethod
+    def _operand(sentence):
+        """Returns the pieces writing sentence as an operand."""
+        if sentence._bare():
+            return [sentence]
+        return ["(", sentence, ")"]
 
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
-        return set()
+        return set(self.symbol_set())
+
+    def symbol_set(self):
+        """Returns a frozenset of all symbols, cached."""
+        return frozenset()
+
+    def operands(self):
+        """Returns the sub-sentences the sentence is built from."""
+        return ()
+
+    def instruction(self, program):
+        """Returns the (op, *args) instruction computing the sentence."""
+        raise Exception("nothing to evaluate")
+
+    def compile(self, symbols=None):
+        """
+        Returns a Program evaluating the sentence on a bitmask model,
+        where bit i is the value of symbols[i] (by default the sorted
+        symbols of the sentence). Cached per sentence and symbol order.
+        """
+        if symbols is None:
+            symbols = sorted(self.symbols())
+        symbols = tuple(symbols)
+        cache = self._caches()
+        if cache.compiled is None:
+            cache.compiled = {}
+        program = cache.compiled.get(symbols)
+        if program is None:
+            program = cache.compiled[symbols] = Program(self, symbols)
+        return program
+
+    def _caches(self):
+        """Returns the sentence's _Cache for the current generation."""
+        cache = self._cache
+        if cache is None or cache.generation != _generation:
+            cache = self._cache = _Cache(
+                None if cache is None else cache.interner
+            )
+        return cache
+
+    def __getstate__(self):
+        # Caches are rebuilt on demand; compiled programs hold generated
+        # code and cannot be pickled
+        return {key: value for key, value in self.__dict__.items()
+                if not key.startswith("_")}
 
     @classmethod
     def validate(cls, sentence):
@@ -50,6 +175,7 @@ class Symbol(Sentence):
     def __eq__(self, other):
         return isinstance(other, Symbol) and self.name == other.name
 
+    @_cached
     def __hash__(self):
         return hash(("symbol", self.name))
 
@@ -62,11 +188,21 @@ class Symbol(Sentence):
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
-    def formula(self):
-        return self.name
+    def _pieces(self):
+        return [self.name]
 
-    def symbols(self):
-        return {self.name}
+    def _bare(self):
+        return Sentence.parenthesize(self.name) == self.name
+
+    @_cached
+    def symbol_set(self):
+        return frozenset([self.name])
+
+    def instruction(self, program):
+        try:
+            return ("symbol", program.index[self.name])
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
 
 
 class Not(Sentence):
@@ -77,6 +213,7 @@ class Not(Sentence):
     def __eq__(self, other):
         return isinstance(other, Not) and self.operand == other.operand
 
+    @_cached
     def __hash__(self):
         return hash(("not", hash(self.operand)))
 
@@ -86,11 +223,21 @@ class Not(Sentence):
     def evaluate(self, model):
         return not self.operand.evaluate(model)
 
-    def formula(self):
-        return "¬" + Sentence.parenthesize(self.operand.formula())
+    def _pieces(self):
+        return ["¬", *Sentence._operand(self.operand)]
 
-    def symbols(self):
-        return self.operand.symbols()
+    def _bare(self):
+        return False
+
+    @_cached
+    def symbol_set(self):
+        return self.operand.symbol_set()
+
+    def operands(self):
+        return (self.operand,)
+
+    def instruction(self, program):
+        return ("not", program.slot(self.operand))
 
 
 class And(Sentence):
@@ -102,6 +249,7 @@ class And(Sentence):
     def __eq__(self, other):
         return isinstance(other, And) and self.conjuncts == other.conjuncts
 
+    @_cached
     def __hash__(self):
         return hash(
             ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
@@ -114,20 +262,44 @@ class And(Sentence):
         return f"And({conjunctions})"
 
     def add(self, conjunct):
+        global _generation
         Sentence.validate(conjunct)
+        # An interned And stops being the shared copy of its old content
+        cache = self._caches()
+        if cache.interner is not None:
+            cache.interner.forget(self)
+            cache.interner = None
         self.conjuncts.append(conjunct)
+        _generation += 1
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
 
-    def formula(self):
+    def _pieces(self):
+        if len(self.conjuncts) == 1:
+            return [self.conjuncts[0]]
+        pieces = []
+        for conjunct in self.conjuncts:
+            if pieces:
+                pieces.append(" ∧ ")
+            pieces.extend(Sentence._operand(conjunct))
+        return pieces
+
+    def _bare(self):
         if len(self.conjuncts) == 1:
-            return self.conjuncts[0].formula()
-        return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
-                           for conjunct in self.conjuncts])
+            return self.conjuncts[0]._bare()
+        return not self.conjuncts
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+    @_cached
+    def symbol_set(self):
+        return _union([conjunct.symbol_set()
+                       for conjunct in self.conjuncts])
+
+    def operands(self):
+        return tuple(self.conjuncts)
+
+    def instruction(self, program):
+        return ("and", *map(program.slot, self.conjuncts))
 
 
 class Or(Sentence):
@@ -139,6 +311,7 @@ class Or(Sentence):
     def __eq__(self, other):
         return isinstance(other, Or) and self.disjuncts == other.disjuncts
 
+    @_cached
     def __hash__(self):
         return hash(
             ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
@@ -151,14 +324,31 @@ class Or(Sentence):
     def evaluate(self, model):
         return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
 
-    def formula(self):
+    def _pieces(self):
         if len(self.disjuncts) == 1:
-            return self.disjuncts[0].formula()
-        return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
-                            for disjunct in self.disjuncts])
+            return [self.disjuncts[0]]
+        pieces = []
+        for disjunct in self.disjuncts:
+            if pieces:
+                pieces.append(" ∨  ")
+            pieces.extend(Sentence._operand(disjunct))
+        return pieces
+
+    def _bare(self):
+        if len(self.disjuncts) == 1:
+            return self.disjuncts[0]._bare()
+        return not self.disjuncts
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+    @_cached
+    def symbol_set(self):
+        return _union([disjunct.symbol_set()
+                       for disjunct in self.disjuncts])
+
+    def operands(self):
+        return tuple(self.disjuncts)
+
+    def instruction(self, program):
+        return ("or", *map(program.slot, self.disjuncts))
 
 
 class Implication(Sentence):
@@ -173,6 +363,7 @@ class Implication(Sentence):
                 and self.antecedent == other.antecedent
                 and self.consequent == other.consequent)
 
+    @_cached
     def __hash__(self):
         return hash(("implies", hash(self.antecedent), hash(self.consequent)))
 
@@ -183,13 +374,24 @@ class Implication(Sentence):
         return ((not self.antecedent.evaluate(model))
                 or self.consequent.evaluate(model))
 
-    def formula(self):
-        antecedent = Sentence.parenthesize(self.antecedent.formula())
-        consequent = Sentence.parenthesize(self.consequent.formula())
-        return f"{antecedent} => {consequent}"
+    def _pieces(self):
+        return [*Sentence._operand(self.antecedent), " => ",
+                *Sentence._operand(self.consequent)]
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def _bare(self):
+        return False
+
+    @_cached
+    def symbol_set(self):
+        return _union([self.antecedent.symbol_set(),
+                       self.consequent.symbol_set()])
+
+    def operands(self):
+        return (self.antecedent, self.consequent)
+
+    def instruction(self, program):
+        return ("implies", program.slot(self.antecedent),
+                program.slot(self.consequent))
 
 
 class Biconditional(Sentence):
@@ -204,6 +406,7 @@ class Biconditional(Sentence):
                 and self.left == other.left
                 and self.right == other.right)
 
+    @_cached
     def __hash__(self):
         return hash(("biconditional", hash(self.left), hash(self.right)))
 
@@ -216,48 +419,521 @@ class Biconditional(Sentence):
                 or (not self.left.evaluate(model)
                     and not self.right.evaluate(model)))
 
-    def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
-        return f"{left} <=> {right}"
-
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
+    def _pieces(self):
+        return [*Sentence._operand(self.left), " <=> ",
+                *Sentence._operand(self.right)]
+
+    def _bare(self):
+        return False
+
+    @_cached
+    def symbol_set(self):
+        return _union([self.left.symbol_set(), self.right.symbol_set()])
+
+    def operands(self):
+        return (self.left, self.right)
+
+    def instruction(self, program):
+        return ("iff", program.slot(self.left), program.slot(self.right))
+
+
+class AndCounts():
+    """
+    Records Ands with their number of conjuncts, to tell later if any
+    of them has been changed. Conjuncts are only ever appended, by
+    And.add, so a changed count means a changed And; caches built from
+    sentences can use this to outlive changes to other sentences.
+    """
+
+    def __init__(self):
+        # id -> (And, number of conjuncts when recorded)
+        self.counts = {}
+
+    def record(self, sentence):
+        self.counts[id(sentence)] = (sentence, len(sentence.conjuncts))
+
+    def watch(self, sentence):
+        """Records every And nested in sentence."""
+        seen = set()
+        stack = [sentence]
+        while stack:
+            sentence = stack.pop()
+            if id(sentence) in seen:
+                continue
+            seen.add(id(sentence))
+            if isinstance(sentence, And):
+                self.record(sentence)
+            stack.extend(sentence.operands())
+
+    def changed(self):
+        """Checks if a recorded And has been changed since."""
+        return any(len(sentence.conjuncts) != count
+                   for sentence, count in self.counts.values())
+
+
+# Most symbols a KnowledgeBase keeps its models of as a bitset (2^20
+# bits is 128 KiB); past that it holds a SAT solver instead
+KB_BITS = 20
+
+
+class KnowledgeBase(And):
+    """
+    A conjunction that keeps what it knows between queries, so asking
+    it many queries does not start from scratch every time. With the
+    "bitwise" backend it holds the set of models that satisfy every
+    conjunct, one bit per model, and each add narrows that set; with
+    "sat" (or past KB_BITS symbols) it holds a SAT solver with the
+    clauses of every conjunct and asks it each query as an assumption;
+    with "bdd" it holds the binary decision diagram of the conjunction.
+
+    model_check(kb, query) uses it automatically. If a sentence nested
+    in the knowledge base is changed with And.add, the state is rebuilt
+    on the next query; changes to sentences elsewhere do not affect it.
+    """
+
+    def __init__(self, *conjuncts, backend="bitwise"):
+        super().__init__(*conjuncts)
+        self.backend = backend
+        self.reset()
+
+    def reset(self):
+        """Rebuilds the state from the conjuncts."""
+        self.mode = self.backend
+        if self.mode == "bitwise" and len(self.symbol_set()) > KB_BITS:
+            self.mode = "sat"
+        if self.mode not in ("bitwise", "sat", "bdd"):
+            raise ValueError(f"unknown KnowledgeBase backend {self.mode!r}")
+
+        # Symbol names in bit order, their columns, and the satisfying
+        # models; with no symbols there is one model, and it satisfies
+        # the (so far empty) conjunction
+        self.names = []
+        self.columns = []
+        self.models = 1
+        # The Ands nested in the conjuncts narrowed in so far
+        self.nested = AndCounts()
+        self.encoder = None
+        self.manager = None
+        if self.mode == "sat":
+            import sat
+            self.encoder = sat.Encoder()
+        elif self.mode == "bdd":
+            import bdd
+            self.manager = bdd.BDD()
+            self.node = bdd.TRUE
+        for conjunct in self.conjuncts:
+            self.narrow(conjunct)
+
+    def stale(self):
+        """Checks if an And nested in the conjuncts changed since."""
+        return self.nested.changed()
 
-
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
-
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
-
-        # If model has an assignment for each symbol
-        if not symbols:
-
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
+    def add(self, conjunct):
+        stale = self.stale()
+        super().add(conjunct)
+        if stale:
+            return
+        new = conjunct.symbol_set().difference(self.names)
+        if self.mode == "bitwise" and len(self.names) + len(new) > KB_BITS:
+            self.reset()
         else:
+            self.narrow(conjunct)
+
+    def narrow(self, conjunct):
+        """Adds what is known about conjunct to the state."""
+        self.nested.watch(conjunct)
+        if self.mode == "sat":
+            self.encoder.add(conjunct)
+            return
+        if self.mode == "bdd":
+            self.node = self.manager.conjoin(self.node,
+                                             self.manager.build(conjunct))
+            return
+        self.names, self.models, self.columns = KnowledgeBase.extend(
+            self.names, self.models, self.columns, conjunct.symbol_set()
+        )
+        self.models &= conjunct.compile(self.names).bitwise(
+            self.columns, (1 << (1 << len(self.names))) - 1
+        )
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
-
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
-
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
-
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+    @staticmethod
+    def extend(names, models, columns, symbols):
+        """
+        Returns names, models and columns extended with the symbols not
+        in names yet; each new symbol doubles the model space.
+        """
+        names = list(names)
+        for name in sorted(set(symbols).difference(names)):
+            size = 1 << len(names)
+            # The new symbol is false in the old models, true in copies
+            models |= models << size
+            columns = [column | column << size for column in columns]
+            columns.append((1 << size) - 1 << size)
+            names.append(name)
+        return names, models, columns
+
+    def entails(self, query):
+        """Checks if the knowledge base entails query."""
+        if self.stale():
+            self.reset()
+        if self.mode == "sat":
+            solver = self.encoder.solver
+            return not solver.solve([-self.encoder.literal(query)])
+        if self.mode == "bdd":
+            return self.manager.entails(self.node, self.manager.build(query))
+
+        # Symbols only the query mentions are free in every model
+        names, models, columns = KnowledgeBase.extend(
+            self.names, self.models, self.columns, query.symbol_set()
+        )
+        query = query.compile(names).bitwise(
+            columns, (1 << (1 << len(names))) - 1
+        )
+        return not models & ~query
+
+    def satisfiable(self):
+        """Checks if the conjuncts have a model at all."""
+        if self.stale():
+            self.reset()
+        if self.mode == "sat":
+            return self.encoder.solver.solve()
+        if self.mode == "bdd":
+            return self.node != 0  # bdd.FALSE
+        return self.models != 0
+
+
+class Interner():
+    """
+    Hash-consing factory for sentences: every distinct sentence built or
+    interned through it is one shared object, so equal sub-sentences of
+    large generated knowledge bases are stored, hashed and compiled once.
+
+        interner = Interner()
+        a = interner.make(Symbol, "A")
+        kb = interner.make(And, interner.make(Or, a, b), ...)
+        kb = interner.intern(And(...))
+
+    Shared sentences must not change: And.add on an interned And takes
+    it out of the table, but other sentences already sharing it see the
+    new conjunct too.
+    """
+
+    def __init__(self):
+        # (class, *operands) or (Symbol, name) -> the shared sentence;
+        # entries go away with the last reference to the sentence
+        self.table = weakref.WeakValueDictionary()
+
+    def make(self, cls, *args):
+        """
+        Returns the shared cls(*args). args are sentences, interned
+        first, except for Symbol, which takes a name.
+        """
+        if cls is Symbol:
+            key = (cls, *args)
+        else:
+            args = tuple(map(self.intern, args))
+            key = (cls, *args)
+        sentence = self.table.get(key)
+        if sentence is None:
+            sentence = self.add(key, cls(*args))
+        return sentence
+
+    def intern(self, sentence):
+        """Returns the shared sentence equal to sentence."""
+        memo = {}
+
+        def visit(sentence):
+            if sentence._caches().interner is self:
+                return sentence
+            shared = memo.get(id(sentence))
+            if shared is not None:
+                return shared
+            operands = tuple(map(visit, sentence.operands()))
+            key = self.key(sentence, operands)
+            shared = self.table.get(key)
+            if shared is None:
+                # Keep sentence itself unless an operand was replaced
+                if all(new is old for new, old
+                       in zip(operands, sentence.operands())):
+                    shared = self.add(key, sentence)
+                else:
+                    shared = self.add(key, type(sentence)(*operands))
+            memo[id(sentence)] = shared
+            return shared
+
+        return visit(sentence)
+
+    def key(self, sentence, operands):
+        if isinstance(sentence, Symbol):
+            return (Symbol, sentence.name)
+        return (type(sentence), *operands)
+
+    def add(self, key, sentence):
+        sentence._caches().interner = self
+        self.table[key] = sentence
+        return sentence
+
+    def forget(self, sentence):
+        """Takes sentence out of the table, before it changes."""
+        key = self.key(sentence, sentence.operands())
+        if self.table.get(key) is sentence:
+            del self.table[key]
+
+    def __len__(self):
+        return len(self.table)
+
+
+class Program():
+    """
+    A sentence compiled to straight-line code.
+
+    `instructions` lists one (op, *args) tuple per distinct sub-sentence
+    in evaluation order; args are symbol indices for "symbol" and earlier
+    instruction numbers for every other op, and the last instruction is
+    the whole sentence. Calling the program evaluates it on an int model
+    whose bit i is the value of symbols[i].
+
+    The same instructions also run bit-parallel (see `bitwise`) on
+    columns of many models at once: bit j of column i is the value of
+    symbols[i] in model j, and `ones` has a 1 bit for every model.
+    """
+
+    # Python expression for each op, over 0/1 ints (ones = 1) or over
+    # columns. Symbols read bit i of the model, or column i.
+    TEMPLATES = {
+        "not": "t{0} ^ ones",
+        "implies": "t{0} ^ ones | t{1}",
+        "iff": "t{0} ^ t{1} ^ ones",
+    }
+
+    def __init__(self, sentence, symbols):
+        self.symbols = tuple(symbols)
+        self.index = {name: i for i, name in enumerate(self.symbols)}
+        self.instructions = []
+        self.slots = {}
+        self.slot(sentence)
+        self.function = self.generate(columns=False)
+        self.columns_function = None
+
+    def slot(self, sentence):
+        """
+        Returns the number of the instruction computing sentence,
+        adding it (and its operands) first if needed. Equal
+        sub-sentences share one instruction.
+        """
+        slot = self.slots.get(sentence)
+        if slot is None:
+            instruction = sentence.instruction(self)
+            slot = self.slots[sentence] = len(self.instructions)
+            self.instructions.append(instruction)
+        return slot
+
+    def generate(self, columns):
+        """Returns a Python function running the instructions."""
+        # A knowledge base is usually one big And: return as soon as
+        # any of its conjuncts is false, like And.evaluate does
+        root = self.instructions[-1]
+        early = set(root[1:]) if root[0] == "and" else set()
+
+        if columns:
+            lines = ["def run(m, ones):"]
+        else:
+            lines = ["def run(m, ones=1):"]
+        for n, (op, *args) in enumerate(self.instructions):
+            if op == "symbol":
+                if columns:
+                    expression = f"m[{args[0]}]"
+                else:
+                    expression = f"m >> {args[0]} & 1"
+            elif op == "and":
+                expression = " & ".join(f"t{a}" for a in args) or "ones"
+            elif op == "or":
+                expression = " | ".join(f"t{a}" for a in args) or "0"
+            else:
+                expression = Program.TEMPLATES[op].format(*args)
+            lines.append(f"    t{n} = {expression}")
+            if n in early:
+                lines.append(f"    if not t{n}:")
+                lines.append("        return 0")
+        lines.append(f"    return t{len(self.instructions) - 1}")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        return namespace["run"]
+
+    def bitwise(self, columns, ones):
+        """
+        Evaluates the sentence on a block of models given as one
+        column per symbol; returns the column of the sentence.
+        """
+        if self.columns_function is None:
+            self.columns_function = self.generate(columns=True)
+        return self.columns_function(columns, ones)
+
+    def __call__(self, model):
+        return bool(self.function(model))
+
+
+# Models per block in bit-parallel checks: 2^16 bits is an 8 KiB int
+BLOCK_BITS = 16
+
+# Tasks per worker in parallel checks, so that uneven progress does not
+# leave cores idle
+TASKS_PER_WORKER = 4
+
+# Programs, symbol counts and stop event of a parallel check, set in
+# each worker process by init_worker
+_worker = None
+
+
+def model_check(knowledge, query, backend="bitwise", workers=None):
+    """
+    Checks if knowledge base entails query.
+
+    backend is "bitwise" to evaluate blocks of models at once, one bit
+    per model, "models" to evaluate one model at a time, or "sat" to
+    search for a counter-model with a SAT solver (see sat.py), which
+    scales far past the symbol counts truth tables can handle, or
+    "bdd" to compare binary decision diagrams (see bdd.py). A
+    KnowledgeBase answers with its own, already built, state.
+
+    "parallel" splits the bitwise check over `workers` processes (by
+    default one per CPU).
+
+    Both first try forward chaining over the Horn clauses of knowledge
+    (see horn.py), which settles purely Horn knowledge bases, and
+    queries their Horn parts already entail, in linear time.
+    """
+    if isinstance(knowledge, KnowledgeBase):
+        return knowledge.entails(query)
+    if backend in ("bitwise", "parallel"):
+        import horn
+        entailed = horn.entails(knowledge, query)
+        if entailed is not None:
+            return entailed
+    if backend == "sat":
+        import sat
+        return sat.entails(knowledge, query)
+    if backend == "bdd":
+        import bdd
+        return bdd.entails(knowledge, query)
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
-
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    if backend == "parallel":
+        return check_parallel(knowledge, query, symbols, workers)
+    knowledge = knowledge.compile(symbols)
+    query = query.compile(symbols)
+    if backend == "bitwise":
+        return check_bitwise(knowledge, query, len(symbols))
+    if backend == "models":
+        return check_models(knowledge, query, len(symbols))
+    raise ValueError(f"unknown model_check backend {backend!r}")
+
+
+def check_models(knowledge, query, count):
+    """Checks entailment between Programs over `count` symbols."""
+    knowledge = knowledge.function
+    query = query.function
+
+    # Every assignment of the symbols is one int; in each model where
+    # the knowledge base is true, the query must also be true
+    for model in range(1 << count):
+        if knowledge(model) and not query(model):
+            return False
+    return True
+
+
+def check_bitwise(knowledge, query, count, inner=BLOCK_BITS,
+                  blocks=None, stop=None):
+    """
+    Checks entailment between Programs over `count` symbols, a block
+    of up to 2^inner models at a time. `blocks` limits the check to a
+    range of block numbers, and `stop` is an event that ends it early.
+    """
+    inner = min(count, inner)
+    size = 1 << inner
+    ones = (1 << size) - 1
+
+    # Model j of a block gives symbol i < inner the value of bit i of
+    # j; the other symbols are the same throughout a block, given by
+    # the bits of the block number
+    columns = [pattern(i, size) for i in range(inner)]
+    columns.extend([0] * (count - inner))
+    if blocks is None:
+        blocks = range(1 << (count - inner))
+    for block in blocks:
+        if stop is not None and stop.is_set():
+            break
+        for i in range(inner, count):
+            columns[i] = ones if block >> (i - inner) & 1 else 0
+        models = knowledge.bitwise(columns, ones)
+        if models and models & ~query.bitwise(columns, ones):
+            return False
+    return True
+
+
+def check_parallel(knowledge, query, symbols, workers=None):
+    """
+    Checks entailment like check_bitwise, splitting the model space on
+    the last symbols into ranges of blocks checked by worker processes.
+    Stops every worker as soon as one finds a counter-model.
+    """
+    count = len(symbols)
+    workers = workers or os.cpu_count() or 1
+    tasks = workers * TASKS_PER_WORKER
+    split = min(count, max(0, tasks - 1).bit_length())
+    inner = min(BLOCK_BITS, count - split)
+    blocks = 1 << (count - inner)
+    if workers == 1 or blocks == 1:
+        return check_bitwise(knowledge.compile(symbols),
+                             query.compile(symbols), count)
+
+    tasks = min(tasks, blocks)
+    bounds = [blocks * i // tasks for i in range(tasks + 1)]
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "fork" if "fork" in methods else None
+    )
+    stop = context.Event()
+
+    # The sentences go to each worker once, with the initializer
+    with ProcessPoolExecutor(max_workers=min(workers, tasks),
+                             mp_context=context,
+                             initializer=init_worker,
+                             initargs=(knowledge, query, symbols,
+                                       inner, stop)) as executor:
+        pending = {
+            executor.submit(check_blocks, bounds[i], bounds[i + 1])
+            for i in range(tasks)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if not all(future.result() for future in done):
+                stop.set()
+                executor.shutdown(cancel_futures=True)
+                return False
+    return True
+
+
+def init_worker(knowledge, query, symbols, inner, stop):
+    """Compiles the sentences once per worker process."""
+    global _worker
+    _worker = (knowledge.compile(symbols), query.compile(symbols),
+               len(symbols), inner, stop)
+
+
+def check_blocks(start, end):
+    """Runs in a worker: checks blocks start..end-1 of the models."""
+    knowledge, query, count, inner, stop = _worker
+    return check_bitwise(knowledge, query, count, inner,
+                         range(start, end), stop)
+
+
+def pattern(i, size):
+    """
+    Returns the `size`-bit column whose bit j is bit i of j: runs of
+    2^i zeros and 2^i ones.
+    """
+    run = 1 << i
+    period = (1 << run) - 1 << run
+    return period * (((1 << size) - 1) // ((1 << 2 * run) - 1))
@@ -11,7 +11,7 @@ CKnave = Symbol("C is a Knave")
 
 # Puzzle 0
 # A says "I am both a knight and a knave."
-knowledge0 = And(
+knowledge0 = KnowledgeBase(
     Or(AKnight, AKnave),
     Not(And(AKnight, AKnave)),
     AKnave
@@ -21,7 +21,7 @@ knowledge0 = And(
 # A says "We are both knaves."
 # B says nothing.
 puzzle1_Asays = And(AKnave, BKnave)
-knowledge1 = And(
+knowledge1 = KnowledgeBase(
     Implication(AKnave, Not(puzzle1_Asays)),
     Implication(AKnight, puzzle1_Asays),
     Or(AKnight, AKnave),
@@ -37,7 +37,7 @@ knowledge1 = And(
 puzzle2_Asays = Or(And(AKnight, BKnight), And(AKnave, BKnave))
 puzzle2_Bsays = Or(And(AKnight, BKnave), And(AKnave, BKnight))
 
-knowledge2 = And(
+knowledge2 = KnowledgeBase(
     Implication(AKnave, Not(puzzle2_Asays)),
     Implication(AKnight, puzzle2_Asays),
     Implication(BKnave, Not(puzzle2_Bsays)),
@@ -60,7 +60,7 @@ puzzle3_Asays = Or(x, y)
 puzzle3_Bsays1 = y
 puzzle3_Bsays2 = CKnave
 puzzle3_Csays = AKnight
-knowledge3 = And(
+knowledge3 = KnowledgeBase(
     Implication(x, AKnight),
     Implication(AKnight, puzzle3_Asays),
     Implication(AKnave, Not(puzzle3_Asays)),
@@ -0,0 +1,467 @@
+"""
+SAT-based entailment for logic sentences.
+
+Sentences are turned into CNF with the Tseitin transform, which gives
+every compound sub-sentence its own variable so the clauses grow
+linearly with the sentence instead of exponentially. The clauses go to
+a conflict-driven clause-learning (CDCL) solver: unit propagation over
+two watched literals per clause, first-UIP clause learning with
+non-chronological backjumping, activity-based branching and restarts.
+
+A knowledge base entails a query exactly when the knowledge base plus
+the negated query has no model:
+
+    model_check(knowledge, query, backend="sat")
+
+Variables are ints 1, 2, ...; the literal -v is the negation of v.
+"""
+
+import heapq
+
+import logic
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+
+# Activity decay per conflict, and conflicts before the first restart
+DECAY = 0.95
+RESTART = 100
+
+# Learnt clauses kept before the longest are deleted, at least
+LEARNT = 2000
+
+
+class Solver():
+
+    def __init__(self):
+        # Per variable, index 0 unused: 1 true, -1 false, 0 unassigned
+        self.values = [0]
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        # Activity a variable was last pushed onto the order heap with,
+        # or None if it is not on the heap
+        self.queued = [None]
+
+        # literal -> clauses watching it; a clause watches its
+        # first two literals
+        self.watches = {}
+        self.clauses = []
+        self.learnt = []
+
+        # Assigned literals in order, and where each decision level
+        # starts in the trail
+        self.trail = []
+        self.limits = []
+        self.head = 0
+
+        # Heap of (-activity, variable) to pick decisions from; entries
+        # whose activity is not the queued one are stale, and every
+        # unassigned variable has a live entry
+        self.order = []
+        self.increment = 1.0
+        self.max_learnt = LEARNT
+
+        # False once the clauses are known to be unsatisfiable
+        self.ok = True
+        self.model = None
+        self.conflicts = 0
+
+    def new_variable(self):
+        v = len(self.values)
+        self.values.append(0)
+        self.level.append(0)
+        self.reason.append(None)
+        self.activity.append(0.0)
+        self.phase.append(False)
+        self.queued.append(None)
+        self.watches[v] = []
+        self.watches[-v] = []
+        self.enqueue(v)
+        return v
+
+    def value(self, literal):
+        """Returns 1 if literal is true, -1 if false, 0 if unassigned."""
+        value = self.values[abs(literal)]
+        return value if literal > 0 else -value
+
+    def add_clause(self, literals):
+        """
+        Adds the clause (a disjunction of literals). Returns False if
+        the clauses became unsatisfiable.
+        """
+        if not self.ok:
+            return False
+        self.backtrack(0)
+        clause = []
+        for literal in literals:
+            value = self.value(literal)
+            if value == 1 or -literal in clause:
+                return True
+            if value == 0 and literal not in clause:
+                clause.append(literal)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+            if self.propagate() is not None:
+                self.ok = False
+        else:
+            self.attach(clause)
+            self.clauses.append(clause)
+        return self.ok
+
+    def attach(self, clause):
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+
+    def assign(self, literal, reason):
+        v = abs(literal)
+        self.values[v] = 1 if literal > 0 else -1
+        self.level[v] = len(self.limits)
+        self.reason[v] = reason
+        self.trail.append(literal)
+
+    def propagate(self):
+        """
+        Assigns every literal forced by unit clauses. Returns a clause
+        with all literals false if there is a conflict, else None.
+        """
+        values = self.values
+        watches = self.watches
+        trail = self.trail
+        while self.head < len(trail):
+            false = -trail[self.head]
+            self.head += 1
+            watching = watches[false]
+            watches[false] = kept = []
+            for i, clause in enumerate(watching):
+                # Keep the false literal in the second watch
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                first = clause[0]
+                value = values[abs(first)]
+                if (value if first > 0 else -value) == 1:
+                    kept.append(clause)
+                    continue
+
+                # Watch some other literal that is not false
+                for k in range(2, len(clause)):
+                    other = clause[k]
+                    value = values[abs(other)]
+                    if (value if other > 0 else -value) != -1:
+                        clause[1] = other
+                        clause[k] = false
+                        watches[other].append(clause)
+                        break
+                else:
+                    # None left: the clause is unit or conflicting
+                    kept.append(clause)
+                    value = values[abs(first)]
+                    if value:
+                        kept.extend(watching[i + 1:])
+                        return clause
+                    self.assign(first, clause)
+        return None
+
+    def analyze(self, conflict):
+        """
+        Resolves the conflict back to the first unique implication
+        point. Returns the learnt clause, whose first literal is the
+        one to assert, and the level to backjump to.
+        """
+        level = self.level
+        trail = self.trail
+        current = len(self.limits)
+        seen = set()
+        learnt = [0]
+        pending = 0
+        index = len(trail) - 1
+        literal = 0
+        clause = conflict
+        while True:
+            for other in clause:
+                v = abs(other)
+                if other == literal or v in seen or not level[v]:
+                    continue
+                seen.add(v)
+                self.bump(v)
+                if level[v] == current:
+                    pending += 1
+                else:
+                    learnt.append(other)
+
+            # Latest literal of this level involved in the conflict
+            while abs(trail[index]) not in seen:
+                index -= 1
+            literal = trail[index]
+            index -= 1
+            pending -= 1
+            if not pending:
+                break
+            clause = self.reason[abs(literal)]
+        learnt[0] = -literal
+
+        # Drop literals implied by the rest of the clause alone
+        members = {abs(other) for other in learnt}
+        learnt[1:] = [
+            other for other in learnt[1:]
+            if not self.redundant(other, members)
+        ]
+
+        if len(learnt) == 1:
+            return learnt, 0
+        deepest = max(range(1, len(learnt)),
+                      key=lambda i: level[abs(learnt[i])])
+        learnt[1], learnt[deepest] = learnt[deepest], learnt[1]
+        return learnt, level[abs(learnt[1])]
+
+    def redundant(self, literal, members):
+        reason = self.reason[abs(literal)]
+        if reason is None:
+            return False
+        return all(abs(other) in members or not self.level[abs(other)]
+                   for other in reason if other != -literal)
+
+    def bump(self, v):
+        self.activity[v] += self.increment
+        if self.activity[v] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.increment *= 1e-100
+            self.order = []
+            self.queued = [None] * len(self.values)
+            for u in range(1, len(self.values)):
+                self.enqueue(u)
+
+    def enqueue(self, v):
+        if self.queued[v] != self.activity[v]:
+            self.queued[v] = self.activity[v]
+            heapq.heappush(self.order, (-self.activity[v], v))
+
+    def backtrack(self, level):
+        """Undoes every assignment above decision level `level`."""
+        if len(self.limits) <= level:
+            return
+        start = self.limits[level]
+        for literal in self.trail[start:]:
+            v = abs(literal)
+            self.phase[v] = literal > 0
+            self.values[v] = 0
+            self.reason[v] = None
+            self.enqueue(v)
+        del self.trail[start:]
+        del self.limits[level:]
+        self.head = min(self.head, start)
+
+    def decide(self):
+        """Returns the next decision literal, or 0 if all are assigned."""
+        while self.order:
+            activity, v = heapq.heappop(self.order)
+            if -activity != self.queued[v]:
+                continue
+            self.queued[v] = None
+            if not self.values[v]:
+                return v if self.phase[v] else -v
+        return 0
+
+    def reduce(self):
+        """
+        Deletes the longer half of the learnt clauses; called at level
+        0, where only clauses that are reasons there must stay.
+        """
+        self.learnt.sort(key=len)
+        keep = len(self.learnt) // 2
+        deleted = set()
+        for clause in self.learnt[keep:]:
+            if len(clause) > 2 and self.reason[abs(clause[0])] is not clause:
+                deleted.add(id(clause))
+        self.learnt = [clause for clause in self.learnt
+                       if id(clause) not in deleted]
+        for literal, watching in self.watches.items():
+            self.watches[literal] = [clause for clause in watching
+                                     if id(clause) not in deleted]
+        self.max_learnt = int(self.max_learnt * 1.1)
+
+    def solve(self, assumptions=()):
+        """
+        Returns True if the clauses have a model in which all the
+        assumption literals are true, and keeps it in self.model as a
+        list of values by variable. Learnt clauses never depend on the
+        assumptions, so the solver can be reused for other queries.
+        """
+        self.model = None
+        if not self.ok:
+            return False
+        self.backtrack(0)
+        if self.propagate() is not None:
+            self.ok = False
+            return False
+
+        restart = RESTART
+        conflicts = 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                conflicts += 1
+                if not self.limits:
+                    self.ok = False
+                    return False
+                learnt, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.attach(learnt)
+                    self.learnt.append(learnt)
+                    self.assign(learnt[0], learnt)
+                self.increment /= DECAY
+                continue
+
+            if conflicts >= restart:
+                conflicts = 0
+                restart = int(restart * 1.5)
+                self.backtrack(0)
+                if len(self.learnt) > self.max_learnt:
+                    self.reduce()
+                continue
+
+            # Assumptions are decided first, one per level
+            level = len(self.limits)
+            if level < len(assumptions):
+                decision = assumptions[level]
+                value = self.value(decision)
+                if value == -1:
+                    self.backtrack(0)
+                    return False
+                if value == 1:
+                    self.limits.append(len(self.trail))
+                    continue
+            else:
+                decision = self.decide()
+                if not decision:
+                    self.model = [value == 1 for value in self.values]
+                    self.backtrack(0)
+                    return True
+            self.limits.append(len(self.trail))
+            self.assign(decision, None)
+
+
+class Clauses():
+    """Stands in for Solver to collect the clauses of an Encoder."""
+
+    def __init__(self):
+        self.count = 0
+        self.clauses = []
+
+    def new_variable(self):
+        self.count += 1
+        return self.count
+
+    def add_clause(self, literals):
+        self.clauses.append(frozenset(literals))
+        return True
+
+
+class Encoder():
+    """
+    Tseitin encoding of sentences into the clauses of a Solver: one
+    variable per symbol and per distinct compound sub-sentence, defined
+    to be equivalent to it.
+    """
+
+    def __init__(self, solver=None):
+        self.solver = Solver() if solver is None else solver
+        self.variables = {}
+        self.literals = {}
+        # Ands encoded into self.literals, and the generation it was
+        # last checked against
+        self.ands = logic.AndCounts()
+        self.generation = logic._generation
+        self.true = None
+
+    def variable(self, name):
+        """Returns the variable of the symbol called name."""
+        v = self.variables.get(name)
+        if v is None:
+            v = self.variables[name] = self.solver.new_variable()
+        return v
+
+    def literal(self, sentence):
+        """Returns a literal equivalent to sentence."""
+        # Cached literals of sentences changed by And.add since are
+        # stale; their clauses stay but nothing refers to them. Changes
+        # to sentences never encoded here leave the cache alone
+        if self.generation != logic._generation:
+            self.generation = logic._generation
+            if self.ands.changed():
+                self.literals = {}
+                self.ands = logic.AndCounts()
+        literal = self.literals.get(sentence)
+        if literal is None:
+            literal = self.literals[sentence] = self.encode(sentence)
+        return literal
+
+    def encode(self, sentence):
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        if isinstance(sentence, Not):
+            return -self.literal(sentence.operand)
+        if isinstance(sentence, And):
+            self.ands.record(sentence)
+            return self.conjunction([self.literal(conjunct)
+                                     for conjunct in sentence.conjuncts])
+        if isinstance(sentence, Or):
+            return -self.conjunction([-self.literal(disjunct)
+                                      for disjunct in sentence.disjuncts])
+        if isinstance(sentence, Implication):
+            return -self.conjunction([self.literal(sentence.antecedent),
+                                      -self.literal(sentence.consequent)])
+        if isinstance(sentence, Biconditional):
+            left = self.literal(sentence.left)
+            right = self.literal(sentence.right)
+            x = self.solver.new_variable()
+            self.solver.add_clause([-x, -left, right])
+            self.solver.add_clause([-x, left, -right])
+            self.solver.add_clause([x, left, right])
+            self.solver.add_clause([x, -left, -right])
+            return x
+        raise TypeError(f"cannot encode {type(sentence).__name__}")
+
+    def conjunction(self, literals):
+        """Returns a literal equivalent to the And of literals."""
+        if not literals:
+            if self.true is None:
+                self.true = self.solver.new_variable()
+                self.solver.add_clause([self.true])
+            return self.true
+        if len(literals) == 1:
+            return literals[0]
+        x = self.solver.new_variable()
+        for literal in literals:
+            self.solver.add_clause([-x, literal])
+        self.solver.add_clause([x] + [-literal for literal in literals])
+        return x
+
+    def add(self, sentence):
+        """
+        Adds clauses making sentence true. Top-level conjunctions and
+        disjunctions become clauses directly, without a variable.
+        """
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct)
+        elif isinstance(sentence, Or):
+            self.solver.add_clause([self.literal(disjunct)
+                                    for disjunct in sentence.disjuncts])
+        elif isinstance(sentence, Implication):
+            self.solver.add_clause([-self.literal(sentence.antecedent),
+                                    self.literal(sentence.consequent)])
+        else:
+            self.solver.add_clause([self.literal(sentence)])
+
+
+def entails(knowledge, query):
+    """Checks if knowledge base entails query."""
+    encoder = Encoder()
+    encoder.add(knowledge)
+    return not encoder.solver.solve([-encoder.literal(query)])
@@ -0,0 +1,289 @@
+"""
+Reading and writing logic sentences.
+
+    parse(sentence.formula())        text, as written by formula()
+    loads(dumps(sentence))           compact binary
+    from_dimacs(to_dimacs(sentence)) CNF for external SAT solvers
+
+parse reads the notation of formula(): ¬, ∧, ∨, => and <=>, binding in
+that order from tightest to loosest, and parentheses. Everything else
+is a symbol name, so names may hold spaces; surrounding spaces are
+dropped. Chains of ∧ or ∨ become one And or Or. Empty And() and Or()
+and names holding operators have no formula to read back.
+
+dumps writes the sentence as a graph: every distinct sub-sentence
+object and every symbol name is stored once, however often it is
+shared, so the knowledge bases built by Interner or by loops over the
+same symbols stay small, and loads rebuilds the same sharing. Neither
+parse nor the binary format recurses, so deep sentences are fine.
+
+to_dimacs gives the Tseitin CNF of sat.Encoder. Symbols are named in
+"c <variable> <name>" comment lines; the other variables stand for
+sub-sentences. The CNF has exactly as many models as the sentence.
+"""
+
+import re
+
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+from sat import Clauses, Encoder
+
+# Binding strength of binary operators, and those grouping to the right
+PRECEDENCE = {"∧": 4, "∨": 3, "=>": 2, "<=>": 1}
+RIGHT = {"=>"}
+
+OPERATORS = re.compile(r"<=>|=>|[¬∧∨()]")
+
+MAGIC = b"LGC1"
+
+# Node kinds of the binary format
+SYMBOL, NOT, AND, OR, IMPLICATION, BICONDITIONAL = range(6)
+KINDS = {Not: NOT, And: AND, Or: OR,
+         Implication: IMPLICATION, Biconditional: BICONDITIONAL}
+
+
+def tokenize(text):
+    """Returns (token, position) pairs; names are stripped strings."""
+    tokens = []
+    position = 0
+    for match in OPERATORS.finditer(text + "("):
+        name = text[position:match.start()]
+        if name.strip():
+            start = position + len(name) - len(name.lstrip())
+            tokens.append((name.strip(), start))
+        if match.start() < len(text):
+            tokens.append((match.group(), match.start()))
+        position = match.end()
+    return tokens
+
+
+def parse(text):
+    """Returns the sentence written in text."""
+    # Operator precedence parsing; unfinished chains of ∧ and ∨ sit on
+    # the value stack as [operator, operands] until something closes them
+    values = []
+    operators = []
+
+    def close(value):
+        if isinstance(value, list):
+            cls = And if value[0] == "∧" else Or
+            return cls(*value[1])
+        return value
+
+    def reduce():
+        operator = operators.pop()
+        if operator == "¬":
+            values.append(Not(close(values.pop())))
+            return
+        right = close(values.pop())
+        left = values.pop()
+        if operator in ("∧", "∨"):
+            if isinstance(left, list) and left[0] == operator:
+                left[1].append(right)
+                values.append(left)
+            else:
+                values.append([operator, [close(left), right]])
+        elif operator == "=>":
+            values.append(Implication(close(left), right))
+        else:
+            values.append(Biconditional(close(left), right))
+
+    operand = True
+    for token, position in tokenize(text):
+        if token in ("¬", "("):
+            if not operand:
+                raise ValueError(f"unexpected {token!r} at {position}")
+            operators.append(token)
+        elif token == ")":
+            if operand:
+                raise ValueError(f"unexpected ')' at {position}")
+            while operators and operators[-1] != "(":
+                reduce()
+            if not operators:
+                raise ValueError(f"unmatched ')' at {position}")
+            operators.pop()
+            values[-1] = close(values[-1])
+        elif token in PRECEDENCE:
+            if operand:
+                raise ValueError(f"unexpected {token!r} at {position}")
+            precedence = PRECEDENCE[token]
+            while operators and operators[-1] != "(":
+                top = operators[-1]
+                stronger = top == "¬" or PRECEDENCE[top] > precedence
+                if not (stronger or (PRECEDENCE[top] == precedence
+                                     and token not in RIGHT)):
+                    break
+                reduce()
+            operators.append(token)
+            operand = True
+            continue
+        else:
+            if not operand:
+                raise ValueError(f"unexpected {token!r} at {position}")
+            values.append(Symbol(token))
+        operand = token in ("¬", "(")
+
+    if operand:
+        raise ValueError("formula ends without an operand")
+    while operators:
+        if operators[-1] == "(":
+            raise ValueError("unmatched '('")
+        reduce()
+    return close(values.pop())
+
+
+def write_number(out, n):
+    """Appends n as a varint: 7 bits per byte, low bits first."""
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def dumps(sentence):
+    """Returns sentence as bytes, for loads."""
+    out = bytearray(MAGIC)
+    body = bytearray()
+    # id of each sentence, and each symbol name -> node number
+    nodes = {}
+    symbols = {}
+    count = 0
+
+    # Post-order over distinct objects; the root is the last node
+    stack = [(sentence, False)]
+    while stack:
+        sentence, expanded = stack.pop()
+        if id(sentence) in nodes:
+            continue
+        if isinstance(sentence, Symbol):
+            node = symbols.get(sentence.name)
+            if node is None:
+                node = symbols[sentence.name] = count
+                count += 1
+                name = sentence.name.encode()
+                body.append(SYMBOL)
+                write_number(body, len(name))
+                body += name
+            nodes[id(sentence)] = node
+        elif not expanded:
+            stack.append((sentence, True))
+            for operand in reversed(sentence.operands()):
+                stack.append((operand, False))
+        else:
+            kind = next((KINDS[cls] for cls in type(sentence).__mro__
+                         if cls in KINDS), None)
+            if kind is None:
+                raise TypeError(f"cannot write {type(sentence).__name__}")
+            operands = sentence.operands()
+            body.append(kind)
+            if kind in (AND, OR):
+                write_number(body, len(operands))
+            for operand in operands:
+                write_number(body, nodes[id(operand)])
+            nodes[id(sentence)] = count
+            count += 1
+
+    write_number(out, count)
+    return bytes(out + body)
+
+
+def loads(data):
+    """Returns the sentence in bytes written by dumps."""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a serialized sentence")
+    position = len(MAGIC)
+
+    def read_number():
+        nonlocal position
+        n = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    try:
+        count = read_number()
+        nodes = []
+        while len(nodes) < count:
+            kind = data[position]
+            position += 1
+            if kind == SYMBOL:
+                length = read_number()
+                name = data[position:position + length]
+                if len(name) < length:
+                    raise IndexError
+                position += length
+                nodes.append(Symbol(name.decode()))
+            elif kind in (AND, OR):
+                operands = [nodes[read_number()]
+                            for _ in range(read_number())]
+                nodes.append((And if kind == AND else Or)(*operands))
+            elif kind == NOT:
+                nodes.append(Not(nodes[read_number()]))
+            elif kind in (IMPLICATION, BICONDITIONAL):
+                cls = Implication if kind == IMPLICATION else Biconditional
+                left = nodes[read_number()]
+                nodes.append(cls(left, nodes[read_number()]))
+            else:
+                raise ValueError(f"unknown node kind {kind}")
+    except IndexError:
+        raise ValueError("truncated serialized sentence")
+    if not nodes:
+        raise ValueError("empty serialized sentence")
+    return nodes[-1]
+
+
+def to_dimacs(sentence):
+    """Returns the CNF of sentence in DIMACS format."""
+    clauses = Clauses()
+    encoder = Encoder(clauses)
+    encoder.add(sentence)
+    lines = [f"c {v} {name}" for name, v in encoder.variables.items()]
+    lines.append(f"p cnf {clauses.count} {len(clauses.clauses)}")
+    for clause in clauses.clauses:
+        lines.append(" ".join([str(literal)
+                               for literal in sorted(clause, key=abs)]
+                              + ["0"]))
+    return "\n".join(lines) + "\n"
+
+
+def from_dimacs(text):
+    """
+    Returns the And of the clauses in DIMACS text. Variables named in
+    to_dimacs comments get their symbol, others are called x<variable>.
+    """
+    names = {}
+    numbers = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0] == "p":
+            continue
+        if fields[0] == "c":
+            fields = line.split(maxsplit=2)
+            if len(fields) == 3 and fields[1].isdigit():
+                names[int(fields[1])] = fields[2]
+            continue
+        numbers.extend(map(int, fields))
+
+    symbols = {}
+
+    def literal(n):
+        v = abs(n)
+        symbol = symbols.get(v)
+        if symbol is None:
+            symbol = symbols[v] = Symbol(names.get(v, f"x{v}"))
+        return symbol if n > 0 else Not(symbol)
+
+    clauses = []
+    clause = []
+    for n in numbers:
+        if n:
+            clause.append(literal(n))
+        else:
+            clauses.append(Or(*clause))
+            clause = []
+    if clause:
+        raise ValueError("last clause does not end with 0")
+    return And(*clauses)
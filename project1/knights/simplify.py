@@ -0,0 +1,276 @@
+"""
+Simplification and normal forms for logic sentences.
+
+    simplifier = Simplifier()
+    smaller = simplifier.simplify(knowledge)
+    print(simplifier.report())
+
+simplify runs the shrinking stages (constant folding, double negation
+removal, flattening of nested And / Or, and removal of duplicate and
+complementary operands) until the sentence stops shrinking. nnf, cnf
+and dnf convert to negation, conjunctive and disjunctive normal form;
+cnf and dnf can be exponentially larger than their input, sat.py's
+Tseitin encoding is the linear alternative.
+
+logic.py has no constant sentences, so the empty And() stands for true
+and the empty Or() for false, which is what they evaluate to.
+
+Every stage is memoized on the sentences it has seen, so repeated
+sub-sentences are rewritten once. Results share unchanged
+sub-sentences with the input.
+"""
+
+import itertools
+
+import logic
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+
+# Stages simplify runs, in order
+SHRINKING = ("constants", "negations", "flatten", "duplicates")
+
+
+def is_true(sentence):
+    return isinstance(sentence, And) and not sentence.conjuncts
+
+
+def is_false(sentence):
+    return isinstance(sentence, Or) and not sentence.disjuncts
+
+
+def size(sentence):
+    """Returns the number of distinct sub-sentence objects."""
+    seen = set()
+    stack = [sentence]
+    while stack:
+        sentence = stack.pop()
+        if id(sentence) not in seen:
+            seen.add(id(sentence))
+            stack.extend(sentence.operands())
+    return len(seen)
+
+
+def rebuild(sentence, operands):
+    """
+    Returns sentence if its operands are unchanged, else the same kind
+    of sentence over the new operands.
+    """
+    if all(new is old for new, old in zip(operands, sentence.operands())):
+        if len(operands) == len(sentence.operands()):
+            return sentence
+    if isinstance(sentence, And):
+        return And(*operands)
+    if isinstance(sentence, Or):
+        return Or(*operands)
+    return type(sentence)(*operands)
+
+
+class Simplifier():
+
+    def __init__(self):
+        # stage -> {sentence: rewritten sentence}
+        self.memo = {}
+        # stage -> [runs, size before, size after]
+        self.stats = {}
+        self.generation = logic._generation
+
+    def run(self, stage, sentence):
+        """
+        Rewrites the whole sentence with one stage, recording how much
+        it shrank.
+        """
+        # Sentences changed by And.add since may be stale memo keys
+        if self.generation != logic._generation:
+            self.generation = logic._generation
+            self.memo = {}
+        memo = self.memo.setdefault(stage, {})
+        rewrite = getattr(self, stage)
+
+        def visit(sentence):
+            result = memo.get(sentence)
+            if result is None:
+                result = memo[sentence] = rewrite(sentence, visit)
+            return result
+
+        result = visit(sentence)
+        stats = self.stats.setdefault(stage, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += size(sentence)
+        stats[2] += size(result)
+        return result
+
+    def report(self):
+        """
+        Returns {stage: (runs, size before, size after)}, summed over
+        every run of the stage so far.
+        """
+        return {stage: tuple(stats) for stage, stats in self.stats.items()}
+
+    def simplify(self, sentence):
+        """Runs the shrinking stages until the sentence stops shrinking."""
+        while True:
+            before = size(sentence)
+            for stage in SHRINKING:
+                sentence = self.run(stage, sentence)
+            if size(sentence) >= before:
+                return sentence
+
+    def nnf(self, sentence):
+        """Returns sentence with Not applied only to symbols."""
+        return self.run("negation_normal", sentence)
+
+    def cnf(self, sentence):
+        """Returns sentence as an And of Ors of literals."""
+        return self.run("conjunctive", self.nnf(sentence))
+
+    def dnf(self, sentence):
+        """Returns sentence as an Or of Ands of literals."""
+        return self.run("disjunctive", self.nnf(sentence))
+
+    # Stages: each rewrites one sentence, using visit for its operands
+
+    def constants(self, sentence, visit):
+        operands = [visit(operand) for operand in sentence.operands()]
+        if isinstance(sentence, Not):
+            if is_true(operands[0]):
+                return Or()
+            if is_false(operands[0]):
+                return And()
+        elif isinstance(sentence, And):
+            if any(map(is_false, operands)):
+                return Or()
+            operands = [o for o in operands if not is_true(o)]
+            if len(operands) == 1:
+                return operands[0]
+        elif isinstance(sentence, Or):
+            if any(map(is_true, operands)):
+                return And()
+            operands = [o for o in operands if not is_false(o)]
+            if len(operands) == 1:
+                return operands[0]
+        elif isinstance(sentence, Implication):
+            antecedent, consequent = operands
+            if is_false(antecedent) or is_true(consequent):
+                return And()
+            if is_true(antecedent):
+                return consequent
+            if is_false(consequent):
+                return Not(antecedent)
+        elif isinstance(sentence, Biconditional):
+            left, right = operands
+            for one, other in ((left, right), (right, left)):
+                if is_true(one):
+                    return other
+                if is_false(one):
+                    return Not(other)
+        return rebuild(sentence, operands)
+
+    def negations(self, sentence, visit):
+        operands = [visit(operand) for operand in sentence.operands()]
+        if isinstance(sentence, Not) and isinstance(operands[0], Not):
+            return operands[0].operand
+        return rebuild(sentence, operands)
+
+    def flatten(self, sentence, visit):
+        operands = [visit(operand) for operand in sentence.operands()]
+        for cls in (And, Or):
+            if isinstance(sentence, cls):
+                flat = []
+                for operand in operands:
+                    if isinstance(operand, cls):
+                        flat.extend(operand.operands())
+                    else:
+                        flat.append(operand)
+                return rebuild(sentence, flat)
+        return rebuild(sentence, operands)
+
+    def duplicates(self, sentence, visit):
+        operands = [visit(operand) for operand in sentence.operands()]
+        if isinstance(sentence, (And, Or)):
+            seen = set()
+            unique = []
+            for operand in operands:
+                if operand in seen:
+                    continue
+                complement = (operand.operand if isinstance(operand, Not)
+                              else Not(operand))
+                if complement in seen:
+                    # x ∧ ¬x is false and x ∨ ¬x is true
+                    return Or() if isinstance(sentence, And) else And()
+                seen.add(operand)
+                unique.append(operand)
+            return rebuild(sentence, unique)
+        if isinstance(sentence, (Implication, Biconditional)):
+            if operands[0] == operands[1]:
+                return And()
+        return rebuild(sentence, operands)
+
+    def negation_normal(self, sentence, visit):
+        if isinstance(sentence, Symbol):
+            return sentence
+        if isinstance(sentence, And):
+            return rebuild(sentence, list(map(visit, sentence.conjuncts)))
+        if isinstance(sentence, Or):
+            return rebuild(sentence, list(map(visit, sentence.disjuncts)))
+        if isinstance(sentence, Implication):
+            return Or(visit(Not(sentence.antecedent)),
+                      visit(sentence.consequent))
+        if isinstance(sentence, Biconditional):
+            left, right = sentence.left, sentence.right
+            return And(Or(visit(Not(left)), visit(right)),
+                       Or(visit(left), visit(Not(right))))
+        if not isinstance(sentence, Not):
+            raise TypeError(f"cannot rewrite {type(sentence).__name__}")
+
+        # Push the negation inwards
+        operand = sentence.operand
+        if isinstance(operand, Symbol):
+            return sentence
+        if isinstance(operand, Not):
+            return visit(operand.operand)
+        if isinstance(operand, And):
+            return Or(*[visit(Not(o)) for o in operand.conjuncts])
+        if isinstance(operand, Or):
+            return And(*[visit(Not(o)) for o in operand.disjuncts])
+        if isinstance(operand, Implication):
+            return And(visit(operand.antecedent),
+                       visit(Not(operand.consequent)))
+        if isinstance(operand, Biconditional):
+            left, right = operand.left, operand.right
+            return Or(And(visit(left), visit(Not(right))),
+                      And(visit(Not(left)), visit(right)))
+        raise TypeError(f"cannot rewrite {type(operand).__name__}")
+
+    def conjunctive(self, sentence, visit):
+        return self.normal_form(sentence, visit, And, Or)
+
+    def disjunctive(self, sentence, visit):
+        return self.normal_form(sentence, visit, Or, And)
+
+    def normal_form(self, sentence, visit, outer, inner):
+        """
+        Rewrites an NNF sentence as an outer (And for CNF) of inners
+        (Or for CNF) of literals, distributing inner over outer.
+        """
+        if isinstance(sentence, outer):
+            terms = [term for operand in sentence.operands()
+                     for term in visit(operand).operands()]
+        elif isinstance(sentence, inner):
+            parts = [visit(operand).operands()
+                     for operand in sentence.operands()]
+            terms = [inner(*[literal for term in combination
+                             for literal in term.operands()])
+                     for combination in itertools.product(*parts)]
+        else:
+            terms = [inner(sentence)]
+
+        # Drop terms holding a literal and its negation (true clauses,
+        # false conjunctions) and repeated literals and terms
+        unique = {}
+        for term in terms:
+            literals = dict.fromkeys(term.operands())
+            if any(Not(literal) in literals for literal in literals):
+                continue
+            if len(literals) < len(term.operands()):
+                term = inner(*literals)
+            unique.setdefault(term, term)
+        return outer(*unique)
@@ -1,5 +1,12 @@
 import itertools
+import math
+import multiprocessing
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
+
+# Components with more cells than this are worth a worker process
+PARALLEL_CELLS = 24
 
 
 class Minesweeper():
@@ -135,16 +142,95 @@ class Sentence():
             self.cells.discard(cell)
 
 
+def bits(mask):
+    """
+    Returns the list of single-bit masks set in mask.
+    """
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low)
+        mask ^= low
+    return bits
+
+
+def convolve(first, second):
+    """
+    Returns the distribution of the sum of two independent counts, each
+    given as {value: ways}.
+    """
+    result = {}
+    for i, a in first.items():
+        for j, b in second.items():
+            result[i + j] = result.get(i + j, 0) + a * b
+    return result
+
+
+def count_configurations(cells, constraints):
+    """
+    Counts the ways to place mines on cells, a list of single-bit masks,
+    so that every (mask, count) constraint has count mines in its mask.
+
+    Returns {k: (ways, mines)}: for each number k of mines placed, the
+    number of placements, and per cell how many of them put a mine there.
+    """
+    # Constraints over each cell, and how many cells of each constraint
+    # come at or after each position
+    touching = [[c for c, (mask, _) in enumerate(constraints) if mask & bit]
+                for bit in cells]
+    remaining = [[0] * len(constraints)]
+    for p in reversed(range(len(cells))):
+        row = list(remaining[-1])
+        for c in touching[p]:
+            row[c] += 1
+        remaining.append(row)
+    remaining.reverse()
+
+    # Backtracking over the cells in order, with the placements that
+    # leave the same counts to fill merged into one state, so shared
+    # completions are only counted once:
+    # (counts left, mines so far) -> (ways, mines per cell so far)
+    states = {(tuple(count for _, count in constraints), 0): (1, [])}
+    for p in range(len(cells)):
+        after = remaining[p + 1]
+        following = {}
+        for (needs, k), (ways, mines) in states.items():
+            for mine in (0, 1):
+                left = list(needs)
+                for c in touching[p]:
+                    left[c] -= mine
+                    if not 0 <= left[c] <= after[c]:
+                        break
+                else:
+                    key = (tuple(left), k + mine)
+                    total = ways
+                    column = mines + [ways if mine else 0]
+                    merged = following.get(key)
+                    if merged is not None:
+                        total += merged[0]
+                        column = [a + b for a, b in zip(merged[1], column)]
+                    following[key] = (total, column)
+        states = following
+
+    # Every count is met by now, so k alone tells the states apart
+    return {k: result for (_, k), result in states.items()}
+
+
 class MinesweeperAI():
     """
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=8, workers=None):
 
-        # Set initial height and width
+        # Set initial height and width, and the number of mines hidden
         self.height = height
         self.width = width
+        self.mine_count = mines
+
+        # Worker processes for solving frontier components, by default
+        # one per CPU
+        self.workers = workers
 
         # Keep track of which cells have been clicked on
         self.moves_made = set()
@@ -153,8 +239,52 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Set of sentences about the game known to be true, each a
+        # (cells, count) pair with the cells as a bitmask: bit
+        # i * width + j stands for cell (i, j). Being hashable, equal
+        # sentences are only kept once
+        self.knowledge = set()
+
+        # Bit of each cell -> sentences holding it
+        self.index = {}
+
+        # Sentences added since inference last looked at them
+        self.pending = []
+
+        # Cells neither clicked on nor known to be mines
+        self.unknown = set(itertools.product(range(height), range(width)))
+
+        # Frontier components solved on the last random move, as
+        # frozensets of sentences -> (cells, count_configurations table)
+        self.solved = {}
+
+    def bit(self, cell):
+        i, j = cell
+        return 1 << (i * self.width + j)
+
+    def cells(self, mask):
+        """
+        Returns the list of cells in a bitmask.
+        """
+        return [divmod(bit.bit_length() - 1, self.width) for bit in bits(mask)]
+
+    def add_sentence(self, mask, count):
+        """
+        Adds a sentence to the knowledge, unless it is empty or
+        already known, and queues it for inference.
+        """
+        sentence = (mask, count)
+        if not mask or sentence in self.knowledge:
+            return
+        self.knowledge.add(sentence)
+        for bit in bits(mask):
+            self.index.setdefault(bit, set()).add(sentence)
+        self.pending.append(sentence)
+
+    def remove_sentence(self, sentence):
+        self.knowledge.discard(sentence)
+        for bit in bits(sentence[0]):
+            self.index[bit].discard(sentence)
 
     def mark_mine(self, cell):
         """
@@ -162,8 +292,11 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.unknown.discard(cell)
+        bit = self.bit(cell)
+        for mask, count in list(self.index.get(bit, ())):
+            self.remove_sentence((mask, count))
+            self.add_sentence(mask & ~bit, count - 1)
 
     def mark_safe(self, cell):
         """
@@ -171,51 +304,48 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
-
-    def conclude(self):
-        flag = False
-        new_mines = []
-        new_safes = []
-        for sentence in self.knowledge:
-            if len(sentence.known_mines()) > 0:
-                flag = 1
-                new_mines.extend(list(sentence.known_mines()))
-            if len(sentence.known_safes()) > 0:
-                flag = 1
-                new_safes.extend(list(sentence.known_safes()))
-        # extend the new discovery
-        if len(new_mines) > 0:
-            for mine in new_mines:
-                self.mark_mine(mine)
-        if len(new_safes) > 0:
-            for safe in new_safes:
-                self.mark_safe(safe)
-        return flag
-    
-    def get_sub(self) :
-        flag = False
-        new_knowledge = []
-        for i in range(0, len(self.knowledge)):
-            for j in range(0, len(self.knowledge)):
-                if self.knowledge[j].cells.issubset(self.knowledge[i].cells):
-                    # j is the subset of i
-                    tmp = Sentence(self.knowledge[i].cells - self.knowledge[j].cells,
-                                   self.knowledge[i].count - self.knowledge[j].count)
-                    tag = True
-                    for s in self.knowledge:
-                        if s == tmp:
-                            tag = False
-                            break
-                    if tag == False:
-                        # already have tmp in knowledge
-                        continue
-                    new_knowledge.append(tmp)
-                    flag = True
-        self.knowledge.extend(new_knowledge)
-        return flag
+        bit = self.bit(cell)
+        for mask, count in list(self.index.get(bit, ())):
+            self.remove_sentence((mask, count))
+            self.add_sentence(mask & ~bit, count)
 
+    def infer(self):
+        """
+        Draws every conclusion from the sentences queued in
+        self.pending, until nothing new follows.
+
+        A sentence whose count is 0 makes all its cells safe, and one
+        with as many mines as cells makes them all mines. Otherwise,
+        whenever its cells are a subset of another sentence's, or the
+        other way round, the difference of the two is a new sentence:
+        {A1, A2, A3, A4, A5} = C1 and {A1, A2, A3} = C2 give
+        {A4, A5} = C1 - C2. Only sentences sharing a cell, found
+        through self.index, can be subsets, and each pair is compared
+        when the later of the two is taken from the queue.
+        """
+        while self.pending:
+            sentence = self.pending.pop()
+            if sentence not in self.knowledge:
+                # Changed by marking a cell since it was queued
+                continue
+            mask, count = sentence
+            if count == 0:
+                for cell in self.cells(mask):
+                    self.mark_safe(cell)
+                continue
+            if count == bin(mask).count("1"):
+                for cell in self.cells(mask):
+                    self.mark_mine(cell)
+                continue
+
+            related = set().union(*[self.index[bit] for bit in bits(mask)])
+            related.discard(sentence)
+            for other_mask, other_count in related:
+                shared = mask & other_mask
+                if shared == mask:
+                    self.add_sentence(other_mask ^ mask, other_count - count)
+                elif shared == other_mask:
+                    self.add_sentence(mask ^ other_mask, count - other_count)
 
     def add_knowledge(self, cell, count):
         """
@@ -233,10 +363,11 @@ class MinesweeperAI():
                if they can be inferred from existing knowledge
         """
         self.moves_made.add(cell)
+        self.unknown.discard(cell)
         self.mark_safe(cell)
 
         x, y = cell
-        neighbor = set()
+        neighbor = 0
         for i in [-1, 0, 1]:
             for j in [-1, 0, 1]:
                 if 0 <= x + i < self.height and 0 <= y + j < self.width:
@@ -245,16 +376,9 @@ class MinesweeperAI():
                         continue
                     if (x + i, y + j) in self.safes:
                         continue # we also ignore
-                    neighbor.add((x + i, y + j))
-        self.knowledge.append(Sentence(neighbor, count))
-        
-        while True:
-            res1 = self.conclude()
-            res2 = self.get_sub()
-            if res1 == 0 and res2 == 0:
-                # no new discovery
-                break
-        
+                    neighbor |= self.bit((x + i, y + j))
+        self.add_sentence(neighbor, count)
+        self.infer()
 
     def make_safe_move(self):
         """
@@ -276,16 +400,149 @@ class MinesweeperAI():
         Should choose randomly among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+
+        Chooses a cell least likely to be a mine, at random among
+        equally likely ones.
         """
-        random_move = set()
-        for i in range(0,self.height):
-            for j in range(0,self.width):
-                random_move.add((i, j))
-        random_move -= self.moves_made
-        random_move -= self.mines
-        if len(random_move) > 0:
-            return list(random_move)[0]
-        return None
+        weights, total = self.mine_weights()
+        if not weights:
+            return None
+        lowest = min(weights.values())
+        return random.choice([cell for cell, weight in weights.items()
+                              if weight == lowest])
+
+    def mine_probabilities(self):
+        """
+        Returns the probability of being a mine of each cell not chosen
+        yet nor known to be a mine, given the knowledge and the number
+        of mines, every placement consistent with both equally likely.
+        """
+        weights, total = self.mine_weights()
+        if not total:
+            return {}
+        return {cell: weight / total for cell, weight in weights.items()}
+
+    def mine_weights(self):
+        """
+        Returns (weights, total): the number of placements of the mines
+        left consistent with the knowledge, and for each cell not chosen
+        yet nor known to be a mine, how many of them put a mine there.
+
+        Sentences sharing cells form components of the frontier, solved
+        independently by count_configurations. The other unknown cells
+        take the mines the components leave, in any of the comb(cells,
+        mines) ways, which weights every component configuration by the
+        global mine count.
+        """
+        groups = self.components()
+        solved = self.solve(groups)
+        frontier = 0
+        for group in groups:
+            for mask, _ in group:
+                frontier |= mask
+        others = [cell for cell in self.unknown
+                  if not self.bit(cell) & frontier and cell not in self.safes]
+        left = self.mine_count - len(self.mines)
+
+        def fill(k):
+            """Ways to put the mines not among k in the other cells."""
+            return math.comb(len(others), left - k) if k <= left else 0
+
+        # Mine count distributions of the first i and last i components
+        counts = [{k: ways for k, (ways, _) in table.items()}
+                  for _, table in solved]
+        prefix = [{0: 1}]
+        for count in counts:
+            prefix.append(convolve(prefix[-1], count))
+        suffix = [{0: 1}]
+        for count in reversed(counts):
+            suffix.append(convolve(count, suffix[-1]))
+        suffix.reverse()
+
+        total = sum(ways * fill(k) for k, ways in prefix[-1].items())
+        weights = {cell: 0 for cell in self.unknown & self.safes}
+        for i, (cells, table) in enumerate(solved):
+            # Placements everywhere else, given k mines in this component
+            rest = convolve(prefix[i], suffix[i + 1])
+            rest = {k: sum(ways * fill(k + j) for j, ways in rest.items())
+                    for k in table}
+            for p, bit in enumerate(cells):
+                cell = divmod(bit.bit_length() - 1, self.width)
+                weights[cell] = sum(mines[p] * rest[k]
+                                    for k, (_, mines) in table.items())
+        if others:
+            weight = sum(ways * math.comb(len(others) - 1, left - k - 1)
+                         for k, ways in prefix[-1].items() if k < left)
+            for cell in others:
+                weights[cell] = weight
+        return weights, total
+
+    def components(self):
+        """
+        Returns the sentences in groups connected through shared cells,
+        each a frozenset.
+        """
+        groups = []
+        seen = set()
+        for sentence in self.knowledge:
+            if sentence in seen:
+                continue
+            seen.add(sentence)
+            group = [sentence]
+            for mask, _ in group:
+                for bit in bits(mask):
+                    for other in self.index[bit]:
+                        if other not in seen:
+                            seen.add(other)
+                            group.append(other)
+            groups.append(frozenset(group))
+        return groups
+
+    def order(self, group):
+        """
+        Returns the cells of a group of sentences as bits, in
+        breadth-first order, so sentences are finished soon after they
+        are started and count_configurations has few counts open.
+        """
+        start = bits(min(mask for mask, _ in group))[0]
+        order = [start]
+        placed = start
+        for bit in order:
+            for mask, _ in self.index[bit]:
+                for other in bits(mask & ~placed):
+                    order.append(other)
+                    placed |= other
+        return order
+
+    def solve(self, groups):
+        """
+        Returns (cells, count_configurations table) for each group,
+        reusing those solved on the last call for unchanged groups, and
+        solving groups with many cells in parallel processes.
+        """
+        solved = {group: self.solved[group]
+                  for group in groups if group in self.solved}
+        todo = [group for group in groups if group not in solved]
+        cells = [self.order(group) for group in todo]
+        constraints = [list(group) for group in todo]
+
+        workers = self.workers or os.cpu_count() or 1
+        large = sum(len(order) > PARALLEL_CELLS for order in cells)
+        if workers > 1 and large > 1:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "fork" if "fork" in methods else None
+            )
+            with ProcessPoolExecutor(max_workers=min(workers, len(todo)),
+                                     mp_context=context) as executor:
+                tables = list(executor.map(count_configurations,
+                                           cells, constraints))
+        else:
+            tables = list(map(count_configurations, cells, constraints))
+
+        solved.update(zip(todo, zip(cells, tables)))
+        self.solved = solved
+        return [solved[group] for group in groups]
 
 '''
 Reflections: